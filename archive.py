@@ -0,0 +1,94 @@
+import functools
+import hashlib
+import os
+import tarfile
+import zipfile
+from io import BytesIO
+
+from cache import file_digest
+
+# The archives read as an input folder, by extension
+ARCHIVE_EXTENSIONS = (
+    ".zip",
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+
+
+class MemoryFile:
+    """A file read into memory, such as a member of an archive, and its name."""
+
+    __slots__ = ("name", "data", "digest")
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.digest = None
+
+    def open(self):
+        """Return a new file object reading the content of the file."""
+        return BytesIO(self.data)
+
+
+def file_name(path):
+    """Return the name recorded for a file, given as a path or a MemoryFile."""
+    if isinstance(path, MemoryFile):
+        return path.name
+    return os.path.basename(path)
+
+
+def file_size(path):
+    """Return the size in bytes of a file, given as a path or a MemoryFile."""
+    if isinstance(path, MemoryFile):
+        return len(path.data)
+    return os.path.getsize(path)
+
+
+def memory_digest(memory_file):
+    """Return the SHA-256 hex digest of the content of a MemoryFile."""
+    if memory_file.digest is None:
+        memory_file.digest = hashlib.sha256(memory_file.data).hexdigest()
+    return memory_file.digest
+
+
+@functools.lru_cache(maxsize=1024)
+def _path_digest(path, size, mtime_ns):
+    return file_digest(path)
+
+
+def content_digest(path):
+    """Return the digest of a file, given as a path or a MemoryFile, hashing it once."""
+    if isinstance(path, MemoryFile):
+        return memory_digest(path)
+    stat = os.stat(path)
+    return _path_digest(path, stat.st_size, stat.st_mtime_ns)
+
+
+def is_archive(path):
+    """Return whether a path is an archive file rather than a folder of receipts."""
+    return os.path.isfile(path) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_members(archive_path, extensions):
+    """Yield the files of an archive with one of the given extensions, as MemoryFile."""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if (
+                    not info.is_dir()
+                    and not name.startswith("__MACOSX/")
+                    and name.lower().endswith(extensions)
+                ):
+                    yield MemoryFile(name, archive.read(info))
+        return
+
+    with tarfile.open(archive_path, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(extensions):
+                yield MemoryFile(member.name, archive.extractfile(member).read())
@@ -0,0 +1,465 @@
+import asyncio
+import hashlib
+import importlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import ocr
+import preprocess
+import scanned
+from archive import MemoryFile, file_name
+from metrics import recorded
+from pipeline import extract_item, input_files
+
+# The number of receipts waiting at most in front of every stage
+QUEUE_SIZE = 8
+
+# The number of files read at once
+READ_TASKS = 2
+
+# How often, in seconds, the depth of the queues is sampled
+SAMPLE_INTERVAL = 0.01
+
+# Put in a queue after the last receipt
+_DONE = object()
+
+
+class Receipt:
+    """A receipt going through the stages of the pipeline, and what they made of it."""
+
+    __slots__ = (
+        "index",
+        "path",
+        "name",
+        "size",
+        "data",
+        "digest",
+        "pages",
+        "images",
+        "text",
+        "rows",
+        "cached",
+        "counts",
+        "error",
+        "stages",
+        "start",
+        "wall",
+    )
+
+    def __init__(self, index, path):
+        self.index = index
+        self.path = path
+        self.name = file_name(path)
+        self.size = self.images = 0
+        self.data = self.digest = self.pages = self.text = self.rows = None
+        self.cached = False
+        self.error = None
+        self.stages = {}
+        self.counts = {}
+        self.start = time.perf_counter()
+        self.wall = None
+
+
+class Stage:
+    """A step of the pipeline, run on every receipt by a number of concurrent tasks."""
+
+    def __init__(self, name, function, tasks=1):
+        self.name = name
+        self.function = function
+        self.tasks = tasks
+
+
+class QueueStats:
+    """The time spent in a stage and the depth of the queue in front of it, sampled."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.busy = 0.0
+        self.depth_sum = 0
+        self.depth_max = 0
+        self.samples = 0
+
+    def sample(self, depth):
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+        self.samples += 1
+
+    def to_dict(self):
+        return {
+            "tasks": self.tasks,
+            "busy": self.busy,
+            "mean_depth": self.depth_sum / self.samples if self.samples else 0.0,
+            "max_depth": self.depth_max,
+        }
+
+
+def _read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def read_stage(cache=None, tasks=READ_TASKS, hashed=False):
+    """Read every file in a thread, hashing it with a cache or when hashed."""
+
+    async def read(receipt):
+        if isinstance(receipt.path, MemoryFile):
+            # Read from its archive already, only keep its content
+            receipt.data, receipt.path = receipt.path.data, None
+        else:
+            receipt.data = await asyncio.to_thread(_read, receipt.path)
+        receipt.size = len(receipt.data)
+        if cache is None and not hashed:
+            return
+        receipt.digest = hashlib.sha256(receipt.data).hexdigest()
+        if cache is None:
+            return
+        rows = cache.get(receipt.digest)
+        if rows is not None:
+            receipt.rows = [row[:2] + [receipt.name] + row[3:] for row in rows]
+            receipt.cached = True
+            receipt.data = None
+
+    return Stage("read", read, tasks)
+
+
+def _extract_pdf(module_name, data, file_name):
+    """Extract a PDF, returning its rows and the record of its stages and pages."""
+    extractor = importlib.import_module(module_name)
+    return recorded(extract_item, extractor.extract_file, MemoryFile(file_name, data))
+
+
+def _record(receipt, record):
+    """Add the stages and counters recorded in a worker to those of a receipt."""
+    for name, seconds in record.pop("stages").items():
+        receipt.stages[name] = receipt.stages.get(name, 0.0) + seconds
+    for name, amount in record.items():
+        receipt.counts[name] = receipt.counts.get(name, 0) + amount
+
+
+def pdf_stages(module_name, executor, workers=1, cache=None, hashed=False):
+    """Return the stages of a PDF extractor: reading, then parsing in a process pool."""
+
+    async def extract(receipt):
+        data, receipt.data = receipt.data, None
+        receipt.rows, record = await asyncio.get_running_loop().run_in_executor(
+            executor, _extract_pdf, module_name, data, receipt.name
+        )
+        _record(receipt, record)
+
+    return [read_stage(cache, hashed=hashed), Stage("parse_pdf", extract, workers)]
+
+
+def _prepare_pages(module_name, name, data, preprocessing):
+    """Decode and prepare the images of a scanned receipt, returned as PGM files."""
+    extractor = importlib.import_module(module_name)
+    image_files = preprocess.receipt_images(BytesIO(data), file_name=name)
+    pages = []
+    for image_file in image_files:
+        image = extractor.prepare_image(image_file, preprocessing)
+        page = BytesIO()
+        image.save(page, "PPM")
+        del image
+        pages.append(page.getvalue())
+    return pages
+
+
+def _parse_text(module_name, text, name):
+    """Parse the OCR text of a scanned receipt into its rows."""
+    extractor = importlib.import_module(module_name)
+    return scanned.receipt_rows(extractor.parse_text(text, name))
+
+
+async def tesseract(image, psm=None, threads=None):
+    """Return the text tesseract recognises in an image file, run as a subprocess."""
+    command = ["tesseract", "stdin", "stdout"]
+    if psm is not None:
+        command += ["--oem", "3", "--psm", str(psm)]
+    environment = None
+    if threads:
+        environment = {**os.environ, "OMP_THREAD_LIMIT": str(threads)}
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=environment,
+    )
+    try:
+        output, errors = await process.communicate(image)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode:
+        raise RuntimeError(
+            f"tesseract failed with status {process.returncode}: "
+            f"{errors.decode(errors='replace').strip()}"
+        )
+    return output.decode()
+
+
+def scanned_stages(
+    module_name, executor, workers=1, cache=None, preprocessing="pil", hashed=False
+):
+    """Return the stages of a scanned extractor: reading, preparing, OCR and parsing."""
+    extractor = importlib.import_module(module_name)
+    threads = ocr.worker_threads(workers)
+
+    async def prepare(receipt):
+        data, receipt.data = receipt.data, None
+        receipt.pages, record = await asyncio.get_running_loop().run_in_executor(
+            executor,
+            recorded,
+            _prepare_pages,
+            module_name,
+            receipt.name,
+            data,
+            preprocessing,
+        )
+        _record(receipt, record)
+
+    async def recognize(receipt):
+        pages, receipt.pages = receipt.pages, None
+        receipt.images = len(pages)
+        texts = [await tesseract(page, extractor.PSM, threads) for page in pages]
+        receipt.text = "\n".join(texts)
+
+    async def parse(receipt):
+        text, receipt.text = receipt.text, None
+        receipt.rows = await asyncio.get_running_loop().run_in_executor(
+            executor, _parse_text, module_name, text, receipt.name
+        )
+
+    return [
+        read_stage(cache, hashed=hashed),
+        Stage("preprocess", prepare, workers),
+        Stage("ocr", recognize, workers),
+        Stage("parse", parse, workers),
+    ]
+
+
+async def _run_stage(stage, inbox, outbox, stats):
+    """Run a stage on the receipts of its inbox until the last one, passing them on."""
+
+    async def work():
+        while True:
+            receipt = await inbox.get()
+            if receipt is _DONE:
+                # Let the other tasks of the stage see it too
+                await inbox.put(_DONE)
+                return
+            if receipt.rows is None and receipt.error is None:
+                start = time.perf_counter()
+                try:
+                    await stage.function(receipt)
+                except Exception as error:
+                    receipt.error = error
+                elapsed = time.perf_counter() - start
+                receipt.stages[stage.name] = elapsed
+                stats.busy += elapsed
+            await outbox.put(receipt)
+
+    tasks = [asyncio.create_task(work()) for _ in range(stage.tasks)]
+    try:
+        await asyncio.wait(tasks)
+    except asyncio.CancelledError:
+        # Cancel the tasks once, and wait for them to kill their subprocesses
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+        raise
+    for task in tasks:
+        task.result()
+    await outbox.put(_DONE)
+
+
+async def extract(
+    paths, stages, handle, queue_size=QUEUE_SIZE, stats=None, other_queues=None
+):
+    """Run the receipts through the stages, handing each to handle() in path order."""
+    queues = [asyncio.Queue(queue_size) for _ in range(len(stages) + 1)]
+    window = asyncio.Semaphore(
+        queue_size * len(queues) + sum(stage.tasks for stage in stages)
+    )
+    if stats is None:
+        stats = {}
+    depths = {}
+    for stage, stage_queue in zip(stages, queues[:-1], strict=True):
+        stats[stage.name] = QueueStats(stage.tasks)
+        depths[stage.name] = stage_queue.qsize
+    depths.update(other_queues or {})
+
+    async def discover():
+        files = iter(paths)
+        index = 0
+        # Take the next file out of the event loop, as it may be read from an archive
+        while (path := await asyncio.to_thread(next, files, _DONE)) is not _DONE:
+            await window.acquire()
+            await queues[0].put(Receipt(index, path))
+            index += 1
+        await queues[0].put(_DONE)
+
+    async def sample():
+        while True:
+            for name, depth in depths.items():
+                stats[name].sample(depth())
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    tasks = [asyncio.create_task(discover()), asyncio.create_task(sample())]
+    for stage, inbox, outbox in zip(stages, queues[:-1], queues[1:], strict=True):
+        tasks.append(
+            asyncio.create_task(_run_stage(stage, inbox, outbox, stats[stage.name]))
+        )
+    try:
+        done = {}
+        next_index = 0
+        while (receipt := await queues[-1].get()) is not _DONE:
+            done[receipt.index] = receipt
+            while next_index in done:
+                receipt = done.pop(next_index)
+                next_index += 1
+                window.release()
+                if receipt.error is not None:
+                    raise receipt.error
+                receipt.wall = time.perf_counter() - receipt.start
+                await handle(receipt)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def write_extracted(
+    write,
+    module_name,
+    folder,
+    workers=1,
+    cache=None,
+    scanned=False,
+    preprocessing="pil",
+    metrics=None,
+    queue_size=QUEUE_SIZE,
+    digests=None,
+):
+    """Extract the receipts of a folder with the asyncio pipeline, writing them with write()."""
+    extractor = importlib.import_module(module_name)
+    paths = input_files(folder, extractor.EXTENSIONS)
+    rows_queue = queue.Queue(queue_size)
+    writing_done = threading.Event()
+    write_stats = QueueStats(1)
+    stats = {"write": write_stats}
+
+    waiting = 0.0
+
+    def queued_rows():
+        nonlocal waiting
+        while True:
+            start = time.perf_counter()
+            rows = rows_queue.get()
+            waiting += time.perf_counter() - start
+            if rows is _DONE:
+                return
+            if isinstance(rows, BaseException):
+                raise rows
+            yield from rows
+
+    def write_queued():
+        start = time.perf_counter()
+        try:
+            return write(queued_rows())
+        finally:
+            write_stats.busy = time.perf_counter() - start - waiting
+            writing_done.set()
+
+    def hand_over(rows):
+        # Stop waiting for room in the queue if the writer has given up
+        while not writing_done.is_set():
+            try:
+                rows_queue.put(rows, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    async def handle(receipt):
+        if cache is not None and not receipt.cached:
+            cache.put(receipt.digest, receipt.rows)
+        if digests is not None:
+            digests[receipt.name] = receipt.digest
+        if metrics is not None:
+            record = {
+                "file": receipt.name,
+                "bytes": receipt.size,
+                "stages": receipt.stages,
+                "images": receipt.images,
+                **receipt.counts,
+                "rows": len(receipt.rows),
+            }
+            if receipt.cached:
+                record["cached"] = True
+            else:
+                record["wall"] = receipt.wall
+            metrics.add(record)
+        await asyncio.to_thread(hand_over, receipt.rows)
+        if writing_done.is_set():
+            raise RuntimeError("The rows stopped being written")
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        writing = loop.run_in_executor(None, write_queued)
+        # The workers are not forked from this process, which runs threads by now, but
+        # from a server process having imported the extractor once
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([module_name])
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        if scanned:
+            stages = scanned_stages(
+                module_name,
+                executor,
+                workers,
+                cache,
+                preprocessing,
+                hashed=digests is not None,
+            )
+        else:
+            stages = pdf_stages(
+                module_name, executor, workers, cache, hashed=digests is not None
+            )
+        try:
+            await extract(
+                paths, stages, handle, queue_size, stats, {"write": rows_queue.qsize}
+            )
+        except BaseException as error:
+            executor.shutdown(wait=False, cancel_futures=True)
+            # Make the writer give up too, and raise its error if it failed first
+            await asyncio.to_thread(hand_over, error)
+            await asyncio.wait([writing])
+            if writing.exception() not in (None, error):
+                raise writing.exception() from None
+            raise
+        executor.shutdown()
+        await asyncio.to_thread(hand_over, _DONE)
+        return await writing
+
+    result = asyncio.run(run())
+    # List the writer after the stages feeding it
+    stats["write"] = stats.pop("write")
+    stats = {name: stage_stats.to_dict() for name, stage_stats in stats.items()}
+    if metrics is not None:
+        metrics.queues = stats
+    return result, stats
+
+
+def print_stats(stats):
+    """Print the busy time of every stage and the depth of the queue in front of it."""
+    print(f"{'stage':<12}{'tasks':>6}{'busy s':>10}{'mean queue':>12}{'max':>6}")
+    for name, stage_stats in stats.items():
+        print(
+            f"{name:<12}{stage_stats['tasks']:>6}{stage_stats['busy']:>10.2f}"
+            f"{stage_stats['mean_depth']:>12.1f}{stage_stats['max_depth']:>6}"
+        )
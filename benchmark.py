@@ -0,0 +1,328 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+EXTRACTORS = ("canac", "canac_scanned", "home_depot", "home_depot_scanned")
+
+DESCRIPTIONS = [
+    "VIS A BOIS #8 1-1/4",
+    "PLANCHE EPINETTE 2X4X8",
+    "PEINTURE BLANCHE 3.78L",
+    "GANTS DE TRAVAIL",
+    "COLLE A CONSTRUCTION",
+    "RUBAN A MESURER 25PI",
+    "CONTREPLAQUE 1/2 4X8",
+    "SCELLANT SILICONE",
+]
+
+
+def receipt_date(rng):
+    """Return a random date of 2023."""
+    return date(2023, 1, 1) + timedelta(days=rng.randrange(365))
+
+
+def receipt_items(rng, item_count):
+    """Return random (code, description, quantity, unit price) tuples."""
+    return [
+        (
+            rng.randrange(10**11, 10**12),
+            rng.choice(DESCRIPTIONS),
+            rng.choice([1, 1, 1, 2, 3, 4, 10]),
+            rng.randrange(99, 9999) / 100,
+        )
+        for _ in range(item_count)
+    ]
+
+
+def totals(items):
+    """Return the subtotal, TPS, TVQ and total of items, with Quebec's tax rates."""
+    sous_total = round(sum(quantity * price for _, _, quantity, price in items), 2)
+    tps = round(sous_total * 0.05, 2)
+    tvq = round(sous_total * 0.09975, 2)
+    return sous_total, tps, tvq, round(sous_total + tps + tvq, 2)
+
+
+def canac_lines(rng, item_count):
+    """Return the text lines of a Canac receipt, laid out like the emailed PDFs."""
+    items = receipt_items(rng, item_count)
+    sous_total, tps, tvq, total = totals(items)
+    lines = [
+        "CANAC",
+        "Magasin 012 - Quebec",
+        "Facture 00123456",
+        "Client: COMPTANT",
+        f"Date: {receipt_date(rng):%Y/%m/%d} 10:42",
+        "Article Description Quantité UdM Prix Unité Total",
+    ]
+    for code, description, quantity, price in items:
+        lines.append(
+            f"{code % 1000000} {description} {quantity} UN {price:.2f} "
+            f"{quantity * price:.2f}"
+        )
+    lines += [
+        f"SOUS-TOTAL {sous_total:.2f}",
+        f"TPS/TVH {tps:.2f}",
+        f"TVP/TVQ {tvq:.2f}",
+        f"TOTAL {total:.2f}",
+        f"Mastercard {total:.2f}",
+        "Merci de votre visite",
+    ]
+    return lines
+
+
+def home_depot_lines(rng, item_count):
+    """Return the text lines of a Home Depot receipt, laid out like the emailed PDFs."""
+    items = receipt_items(rng, item_count)
+    sous_total, tps, tvq, total = totals(items)
+    lines = [
+        "THE HOME DEPOT",
+        "1234 BOUL. DU MAGASIN, QUEBEC",
+        f"7045 00042 55321 {receipt_date(rng):%d-%m-%y} 10:42",
+        "MERCI DE MAGASINER CHEZ NOUS",
+        "VENTE CAISSIER 042",
+    ]
+    for code, description, quantity, price in items:
+        if quantity == 1:
+            lines.append(f"{code}  {description} <A> {price:.2f}".replace(".", ","))
+        else:
+            lines.append(f"{code}  {description} <A>")
+            lines.append(
+                f"{quantity}@{price:.2f} {quantity * price:.2f}".replace(".", ",")
+            )
+    lines += [
+        f"SOUS-TOTAL {sous_total:.2f}".replace(".", ","),
+        f"TPS/TVH {tps:.2f}".replace(".", ","),
+        f"TVP/TVQ {tvq:.2f}".replace(".", ","),
+        f"TOTAL {total:.2f}".replace(".", ","),
+        f"XXXXXXXXXXXX1234 MASTERCARD CAD$ {total:.2f}".replace(".", ","),
+        "CODE D'AUT 012345",
+        "CONSERVEZ VOTRE RECU",
+    ]
+    return lines
+
+
+def canac_scanned_lines(rng, item_count):
+    """Return the text lines of a printed Canac receipt, as its scans show them."""
+    items = receipt_items(rng, item_count)
+    sous_total, tps, tvq, total = totals(items)
+    lines = ["CANAC", f"Date {receipt_date(rng):%m-%d-%y}", ""]
+    for code, description, quantity, price in items:
+        lines.append(f"#produit {code % 1000000}")
+        lines.append(f"{description} {quantity * price:.2f}".replace(".", ","))
+        lines.append(f"{quantity} x {price:.2f}".replace(".", ","))
+    lines += [
+        f"SOUS-TOTAL {sous_total:.2f}".replace(".", ","),
+        f"TPS {tps:.2f}".replace(".", ","),
+        f"TVQ {tvq:.2f}".replace(".", ","),
+        f"TOTAL {total:.2f}".replace(".", ","),
+        "Merci",
+    ]
+    return lines
+
+
+def pdf_string(text):
+    """Return a PDF literal string holding text in the WinAnsi encoding."""
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode("cp1252") + b")"
+
+
+def write_pdf(path, lines):
+    """Write a one-page PDF showing the lines of text, in the fewest bytes possible."""
+    content = b"BT /F1 9 Tf 11 TL 36 806 Td " + b" ".join(
+        pdf_string(line) + b" Tj T*" for line in lines
+    )
+    content += b" ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier "
+        b"/Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    pdf += b"startxref\n%d\n%%%%EOF\n" % xref
+    with open(path, "wb") as file:
+        file.write(pdf)
+
+
+def write_jpeg(path, lines, rng):
+    """Render the lines of text as a noisy, slightly rotated photo of a receipt."""
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+    font = ImageFont.load_default()
+    line_height = 14
+    receipt = Image.new("L", (420, line_height * (len(lines) + 4)), 235)
+    draw = ImageDraw.Draw(receipt)
+    for number, line in enumerate(lines, start=2):
+        draw.text((20, number * line_height), line, fill=20, font=font)
+
+    # Scale it up to a phone photo resolution, and add blur, noise and a small tilt
+    receipt = receipt.resize((receipt.width * 3, receipt.height * 3), Image.BICUBIC)
+    receipt = receipt.filter(ImageFilter.GaussianBlur(1))
+    noise = Image.effect_noise(receipt.size, 12)
+    receipt = Image.blend(receipt, noise, 0.15)
+    receipt = receipt.rotate(rng.uniform(-1.5, 1.5), fillcolor=120, expand=True)
+    receipt.convert("RGB").save(path, quality=85)
+
+
+# Extractor: (function returning the lines of a receipt, file extension)
+GENERATORS = {
+    "canac": (canac_lines, ".pdf"),
+    "canac_scanned": (canac_scanned_lines, ".jpg"),
+    "home_depot": (home_depot_lines, ".pdf"),
+    "home_depot_scanned": (home_depot_lines, ".jpg"),
+}
+
+
+def generate_corpus(folder, extractor, file_count, item_count=20, seed=0):
+    """Write a deterministic corpus of synthetic receipts for an extractor in a folder."""
+    make_lines, extension = GENERATORS[extractor]
+    rng = random.Random(f"{extractor}-{seed}")
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for number in range(file_count):
+        lines = make_lines(rng, rng.randint(item_count // 2, item_count * 3 // 2))
+        path = os.path.join(folder, f"receipt-{number:05}{extension}")
+        if extension == ".pdf":
+            write_pdf(path, lines)
+        else:
+            write_jpeg(path, lines, rng)
+        paths.append(path)
+    return paths
+
+
+def measure(extractor_name, folder, workers):
+    """Extract a folder and write the workbook in a fresh process, returning its measures."""
+    from excel import write_rows
+
+    stages = {}
+    start = time.perf_counter()
+    extractor = importlib.import_module(extractor_name)
+    stages["import"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = list(extractor.iter_rows(folder, workers=workers))
+    stages["extract"] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        start = time.perf_counter()
+        write_rows(os.path.join(output_folder, "rows.xlsx"), extractor.COLUMNS, rows)
+        stages["write"] = time.perf_counter() - start
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "rows": len(rows),
+        "stages": stages,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_child_rss_mib": children / 1024,
+    }
+
+
+def run_benchmark(extractor, folder, file_count, item_count, seed, workers):
+    """Generate a corpus for an extractor and measure it, returning the results."""
+    start = time.perf_counter()
+    generate_corpus(folder, extractor, file_count, item_count, seed)
+    generation = time.perf_counter() - start
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        result = executor.submit(measure, extractor, folder, workers).result()
+    result["stages"]["generate"] = generation
+    elapsed = result["stages"]["extract"] + result["stages"]["write"]
+    result.update(
+        {
+            "extractor": extractor,
+            "files": file_count,
+            "workers": workers,
+            "files_per_second": file_count / elapsed,
+            "rows_per_second": result["rows"] / elapsed,
+        }
+    )
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the extractors on synthetic receipt corpora."
+    )
+    parser.add_argument(
+        "--extractors",
+        nargs="+",
+        choices=EXTRACTORS,
+        default=["canac", "home_depot"],
+        help="extractors to benchmark (default: the PDF ones)",
+    )
+    parser.add_argument(
+        "--files", type=int, default=200, help="receipts per corpus (default: 200)"
+    )
+    parser.add_argument(
+        "--items", type=int, default=20, help="average items per receipt (default: 20)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="corpus seed (default: 0)")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="extraction processes (default: 1)"
+    )
+    parser.add_argument(
+        "--corpus",
+        help="folder to keep the generated corpora in (default: a temporary folder)",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark.json",
+        help="JSON file to save the results to (default: benchmark.json)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        corpus_folder = args.corpus or temporary_folder
+        results = []
+        for extractor in args.extractors:
+            folder = os.path.join(
+                corpus_folder, f"{extractor}-{args.files}-{args.items}-{args.seed}"
+            )
+            result = run_benchmark(
+                extractor, folder, args.files, args.items, args.seed, args.workers
+            )
+            results.append(result)
+            print(
+                f"{extractor:>18}: {result['files_per_second']:8.1f} files/s "
+                f"{result['rows_per_second']:10.1f} rows/s, "
+                f"peak RSS {result['peak_rss_mib']:.1f} MiB"
+            )
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "settings": {
+                    "files": args.files,
+                    "items": args.items,
+                    "seed": args.seed,
+                    "workers": args.workers,
+                },
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results have been saved to '{args.output}'")
@@ -0,0 +1,258 @@
+import contextlib
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+
+# The caches are kept next to the output they are used for
+CACHE_FILE_NAME = ".receipts_cache.sqlite3"
+TEXT_CACHE_FILE_NAME = ".ocr_cache.sqlite3"
+
+DEFAULT_CACHE_PATH = os.path.join("receipts", CACHE_FILE_NAME)
+DEFAULT_CACHE_SIZE = 256 << 20
+
+# The share of its size a full result cache is trimmed down to, so that it is not trimmed
+# again at every write
+TRIM_RATIO = 0.9
+
+DEFAULT_TEXT_CACHE_PATH = os.path.join("receipts", TEXT_CACHE_FILE_NAME)
+DEFAULT_TEXT_CACHE_SIZE = 256 << 20
+
+
+def cache_paths(output_path):
+    """Return the paths of the result and OCR caches of an output, in its folder."""
+    folder = os.path.dirname(os.path.abspath(output_path))
+    return (
+        os.path.join(folder, CACHE_FILE_NAME),
+        os.path.join(folder, TEXT_CACHE_FILE_NAME),
+    )
+
+
+def _connect(path, **options):
+    """Connect to an SQLite database, creating the folder holding it if needed."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    return sqlite3.connect(path, check_same_thread=False, **options)
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Rows parsed from receipt files, stored in SQLite and keyed by file content."""
+
+    def __init__(self, path, extractor, parser_version, max_bytes=DEFAULT_CACHE_SIZE):
+        self.extractor = extractor
+        self.parser_version = parser_version
+        self.max_bytes = max_bytes
+        # The times the digests were last read at since the last trim, marked as used at
+        # the next one
+        self.touched = {}
+        self.opened = time.time()
+        # The size beyond which the cache is trimmed, above its own while the rows used
+        # since it was opened do not fit in it
+        self.trim_size = max_bytes
+        # The rows are pulled by whichever thread writes them out, such as the threads
+        # of pyarrow, one at a time
+        self.connection = _connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " extractor TEXT NOT NULL,"
+                " digest TEXT NOT NULL,"
+                " parser_version INTEGER NOT NULL,"
+                " rows TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " used REAL NOT NULL,"
+                " PRIMARY KEY (extractor, digest))"
+            )
+            columns = [
+                column[1]
+                for column in self.connection.execute("PRAGMA table_info(results)")
+            ]
+            if "size" not in columns:
+                self.connection.execute(
+                    "ALTER TABLE results ADD COLUMN size INTEGER NOT NULL DEFAULT 0"
+                )
+                self.connection.execute(
+                    "UPDATE results SET size = length(CAST(rows AS BLOB))"
+                )
+            if "used" not in columns:
+                self.connection.execute(
+                    "ALTER TABLE results ADD COLUMN used REAL NOT NULL DEFAULT 0"
+                )
+            self.connection.execute(
+                "DELETE FROM results WHERE extractor = ? AND parser_version != ?",
+                (extractor, parser_version),
+            )
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+        if self.size > self.max_bytes:
+            self.trim(self.opened)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, digest):
+        found = self.connection.execute(
+            "SELECT 1 FROM results WHERE extractor = ? AND digest = ?",
+            (self.extractor, digest),
+        ).fetchone()
+        if found is None:
+            return False
+        self.touched[digest] = time.time()
+        return True
+
+    def get(self, digest):
+        """Return the rows cached for a file digest, or None."""
+        found = self.connection.execute(
+            "SELECT rows FROM results WHERE extractor = ? AND digest = ?",
+            (self.extractor, digest),
+        ).fetchone()
+        if found is None:
+            return None
+        self.touched[digest] = time.time()
+        return json.loads(found[0])
+
+    def put(self, digest, rows):
+        """Store the rows parsed from the file with the given digest."""
+        text = json.dumps([list(row) for row in rows])
+        size = len(text.encode())
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results"
+                " (extractor, digest, parser_version, rows, size, used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.extractor,
+                    digest,
+                    self.parser_version,
+                    text,
+                    size,
+                    time.time(),
+                ),
+            )
+        self.size += size
+        # The rows used since the cache was opened may still be read back by the run
+        if self.size > self.trim_size:
+            self.trim(self.opened)
+
+    def mark_used(self):
+        """Mark the entries read since the last call as used when they were read."""
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE results SET used = ? WHERE extractor = ? AND digest = ?",
+                [
+                    (used, self.extractor, digest)
+                    for digest, used in self.touched.items()
+                ],
+            )
+        self.touched.clear()
+
+    def trim(self, kept_since=math.inf):
+        """Drop the least recently used rows, but for those used since kept_since."""
+        self.mark_used()
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM results WHERE (extractor, digest) IN ("
+                " SELECT extractor, digest FROM ("
+                "  SELECT extractor, digest, used,"
+                "   SUM(size) OVER (ORDER BY used DESC, extractor, digest) AS kept"
+                "  FROM results)"
+                " WHERE kept > ? AND used < ?)",
+                (self.max_bytes * TRIM_RATIO, kept_since),
+            )
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+        self.trim_size = max(self.max_bytes, self.size / TRIM_RATIO)
+
+    def close(self):
+        if self.size > self.max_bytes:
+            self.trim()
+        else:
+            self.mark_used()
+        self.connection.close()
+
+
+class TextCache:
+    """OCR texts stored in SQLite, keyed by image content and OCR settings."""
+
+    def __init__(self, path, max_bytes=DEFAULT_TEXT_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.connection = _connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS texts ("
+                " key TEXT PRIMARY KEY,"
+                " text TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " used REAL NOT NULL,"
+                " confidence REAL)"
+            )
+            columns = [
+                column[1]
+                for column in self.connection.execute("PRAGMA table_info(texts)")
+            ]
+            if "confidence" not in columns:
+                self.connection.execute("ALTER TABLE texts ADD COLUMN confidence REAL")
+
+    def get(self, key):
+        """Return the (text, confidence) cached for a key, or None, marking it as used."""
+        found = self.connection.execute(
+            "SELECT text, confidence FROM texts WHERE key = ?", (key,)
+        ).fetchone()
+        if found is None:
+            return None
+        with self.connection:
+            self.connection.execute(
+                "UPDATE texts SET used = ? WHERE key = ?", (time.time(), key)
+            )
+        return found
+
+    def put(self, key, text, confidence=None):
+        """Store the text recognised for a key, then evict beyond the size of the cache."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO texts (key, text, size, used, confidence)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, text, len(text.encode()), time.time(), confidence),
+            )
+            self.connection.execute(
+                "DELETE FROM texts WHERE key IN ("
+                " SELECT key FROM ("
+                "  SELECT key, SUM(size) OVER (ORDER BY used DESC, key) AS kept"
+                "  FROM texts)"
+                " WHERE kept > ?)",
+                (self.max_bytes,),
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def open_cache(
+    extractor,
+    parser_version,
+    enabled=True,
+    path=DEFAULT_CACHE_PATH,
+    max_bytes=DEFAULT_CACHE_SIZE,
+):
+    """Open the result cache of an extractor, or an empty context when it is disabled."""
+    if not enabled:
+        return contextlib.nullcontext()
+    return ResultCache(path, extractor, parser_version, max_bytes)
@@ -1,110 +1,140 @@
 import os
-import re
-from datetime import datetime
 
-import pandas as pd
 import pdfplumber
 
+from metrics import count, stage
+from parsing import (
+    LONG_DATE_PATTERN,
+    RowLayout,
+    find_markers,
+    format_date,
+    lines_between,
+)
+from pipeline import extract_files, input_files
+from table import RowTable
 
-def extract_expenses(pdf_folder_path):
+PARSER_VERSION = 1
+
+# The files extracted, by extension
+EXTENSIONS = (".pdf",)
+
+# The markers of the sections of a receipt
+ITEMS_MARKER = "Article Description Quantité UdM Prix Unité Total"
+MARKERS = (ITEMS_MARKER, "Mastercard")
+
+ROWS = RowLayout("Canac", unit=True)
+
+COLUMNS = [
+    "Store",
+    "Date",
+    "Filename",
+    "Article",
+    "Description",
+    "Quantité",
+    "UdM",
+    "Prix Unité",
+    "Total",
+    "TextSum",
+    "Sum",
+]
+
+
+def parse_text(text, pdf_file_name):
+    """Parse the text of one page of a receipt into rows."""
+    rows = []
+    lines = text.split("\n")
+    markers = find_markers(text, MARKERS)
+
+    # Extract and format the date from the 4th line of the entire text
+    raw_date_match = LONG_DATE_PATTERN.search(lines[4])
+    if raw_date_match:
+        formatted_date = format_date(raw_date_match.group(), "%Y/%m/%d")
+    else:
+        formatted_date = "Unknown Date"
+
+    # Extract lines between "Article Description Quantité UdM Prix Unité Total" and "Mastercard"
+    relevant_lines = lines_between(lines, markers, ITEMS_MARKER, "Mastercard")
+
+    # Iterate through each line
+    for line in relevant_lines:
+        # Split the line by whitespace to get the individual elements
+        elements = line.split()
+        if len(elements) >= 6:
+            rows.append(
+                ROWS.item_row(
+                    formatted_date,
+                    pdf_file_name,
+                    elements[0],
+                    " ".join(elements[1:-4]),
+                    elements[-4],
+                    elements[-2],
+                    elements[-1],
+                    unit=elements[-3],
+                )
+            )
+
+        # Extract amounts for SOUS-TOTAL, TPS/TVH, TVP/TVQ, and TOTAL
+        elif len(elements) <= 4:
+            rows.append(
+                ROWS.sum_row(
+                    formatted_date,
+                    pdf_file_name,
+                    " ".join(elements[:-1]),
+                    elements[-1],
+                )
+            )
+
+    return rows
+
+
+def extract_file(pdf_file, file_name=None, pages=None):
+    """Extract the rows of every page of one PDF file using pdfplumber."""
+    pdf_file_name = file_name or os.path.basename(pdf_file)
+    rows = []
+
+    # Open the PDF file with pdfplumber
+    with stage("open"):
+        if pages is None:
+            pdf = pdfplumber.open(pdf_file)
+        else:
+            start, stop = pages
+            pdf = pdfplumber.open(pdf_file, pages=list(range(start + 1, stop + 1)))
+    with pdf:
+        # Loop through each page in the PDF
+        for page in pdf.pages:
+            count("pages")
+            with stage("extract_text"):
+                text = page.extract_text()
+            with stage("parse"):
+                rows.extend(parse_text(text, pdf_file_name))
+
+    return rows
+
+
+def extract_paths(pdf_paths, workers=1, cache=None, metrics=None):
+    """Yield the rows extracted from each PDF file using pdfplumber, in the order of the paths."""
+    return extract_files(
+        extract_file, pdf_paths, workers, cache, metrics=metrics, split_pages=True
+    )
+
+
+def iter_rows(pdf_folder_path, workers=1, cache=None, metrics=None):
+    """Yield the rows extracted from the PDF files in a folder using pdfplumber."""
+    pdf_paths = input_files(pdf_folder_path, EXTENSIONS)
+    for rows in extract_paths(pdf_paths, workers, cache, metrics):
+        yield from rows
+
+
+def extract_expenses(pdf_folder_path, workers=1, cache=None):
     """Extract tables from PDF files in a folder using pdfplumber."""
-    columns = [
-        "Store",
-        "Date",
-        "Filename",
-        "Article",
-        "Description",
-        "Quantité",
-        "UdM",
-        "Prix Unité",
-        "Total",
-        "TextSum",
-        "Sum",
-    ]
-    data_table = pd.DataFrame(columns=columns)
-
-    # Loop through each PDF file in the folder
-    for pdf_file_name in os.listdir(pdf_folder_path):
-        if pdf_file_name.endswith(".PDF") or pdf_file_name.endswith(".pdf"):
-            pdf_file = os.path.join(pdf_folder_path, pdf_file_name)
-
-            # Open the PDF file with pdfplumber
-            with pdfplumber.open(pdf_file) as pdf:
-                # Loop through each page in the PDF
-                for page in pdf.pages:
-                    # Extract the text
-                    text = page.extract_text()
-
-                    # Extract and format the date from the 4th line of the entire text
-                    raw_date_line = text.split("\n")[4].strip()
-                    raw_date_match = re.search(r"(\d{4}/\d{2}/\d{2})", raw_date_line)
-                    if raw_date_match:
-                        raw_date = raw_date_match.group(1)
-                        formatted_date = datetime.strptime(
-                            raw_date, "%Y/%m/%d"
-                        ).strftime("%Y-%m-%d")
-                    else:
-                        formatted_date = "Unknown Date"
-
-                    # Extract lines between "Article Description Quantité UdM Prix Unité Total" and "Mastercard"
-                    start = text.find(
-                        "Article Description Quantité UdM Prix Unité Total"
-                    )
-                    end = text.find("Mastercard")
-                    relevant_lines = text[start:end].split("\n")[1:-1]
-
-                    # Split the text by lines and iterate through each line
-                    rows = []
-                    for line in relevant_lines:
-                        # Split the line by whitespace to get the individual elements
-                        elements = line.split()
-                        if len(elements) >= 6:
-                            row = {
-                                "Store": "Canac",
-                                "Date": formatted_date,
-                                "Filename": pdf_file_name,
-                                "Article": elements[0],
-                                "Description": " ".join(elements[1:-4]),
-                                "Quantité": elements[-4],
-                                "UdM": elements[-3],
-                                "Prix Unité": elements[-2],
-                                "Total": elements[-1],
-                                "TextSum": "",
-                                "Sum": "",
-                            }
-                            rows.append(row)
-
-                        # Extract amounts for SOUS-TOTAL, TPS/TVH, TVP/TVQ, and TOTAL
-                        elif len(elements) <= 4:
-                            row = {
-                                "Store": "Canac",
-                                "Date": formatted_date,
-                                "Filename": pdf_file_name,
-                                "Article": "",
-                                "Description": "",
-                                "Quantité": "",
-                                "UdM": "",
-                                "Prix Unité": "",
-                                "Total": "",
-                                "TextSum": " ".join(elements[:-1]),
-                                "Sum": elements[-1],
-                            }
-                            rows.append(row)
-
-                    # Create a DataFrame from the rows
-                    data = pd.DataFrame(rows, columns=columns)
-
-                    # Concatenate the DataFrame to the main one
-                    data_table = pd.concat([data_table, data], ignore_index=True)
-
-    data_table["Quantité"] = pd.to_numeric(data_table["Quantité"], errors="coerce")
-    data_table["Prix Unité"] = pd.to_numeric(data_table["Prix Unité"], errors="coerce")
-    data_table["Total"] = pd.to_numeric(data_table["Total"], errors="coerce")
-    data_table["Sum"] = pd.to_numeric(data_table["Sum"], errors="coerce")
-
-    return data_table
-
-
-results = extract_expenses("receipts/Canac")
-results.to_excel("receipts/canac_data.xlsx", index=False)
-print("Tabulated data has been saved to 'canac_data.xlsx'")
+    data_table = RowTable(COLUMNS)
+    data_table.extend(iter_rows(pdf_folder_path, workers, cache))
+    return data_table.to_frame()
+
+
+if __name__ == "__main__":
+    import sys
+
+    import receipts
+
+    receipts.main(["canac", *sys.argv[1:]])
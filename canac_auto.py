@@ -0,0 +1,25 @@
+from functools import partial
+
+import canac
+import canac_scanned
+import router
+
+PARSER_VERSION = router.parser_version(canac, canac_scanned)
+
+COLUMNS = canac.COLUMNS
+
+# The files extracted, by extension
+EXTENSIONS = router.EXTENSIONS
+
+# PDFs with a text layer are parsed like canac.py does, and the other receipts
+# recognised like canac_scanned.py does, see router.extract_paths()
+extract_paths = partial(router.extract_paths, "canac", "canac_scanned")
+iter_rows = partial(router.iter_rows, "canac", "canac_scanned")
+
+
+if __name__ == "__main__":
+    import sys
+
+    import receipts
+
+    receipts.main(["canac-auto", *sys.argv[1:]])
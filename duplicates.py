@@ -0,0 +1,178 @@
+from collections import defaultdict, deque
+
+from archive import MemoryFile, content_digest, file_name
+
+# The size of the perceptual hash of an image, in pixels per side: 32 x 32 differences
+# between neighbouring pixels give a 1024-bit hash. A coarser hash cannot tell apart
+# two receipts of the same store, laid out the same way
+HASH_SIZE = 32
+
+# The most bits by which the hashes of two copies of the same photo differ: a photo
+# resaved or rescaled differs by about 8 bits, two receipts of the same store by 40 or
+# more. Two photos of the same receipt differ as much, and are left to receipt_key()
+MAX_DISTANCE = 15
+
+# The hashes are indexed by bands of the bits whose index gives the same remainder:
+# two hashes differing by MAX_DISTANCE bits or fewer have at least one of their
+# MAX_DISTANCE + 1 bands in common. Every band takes bits from every row of the image,
+# so that the blank margins of the receipts do not all fall in the same bands
+BANDS = MAX_DISTANCE + 1
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# The columns of the rows receipt_key() reads, in the order it reads them
+KEY_COLUMNS = ("Store", "Date", "Total", "TextSum", "Sum")
+
+
+def image_hash(path):
+    """Return the difference hash of a receipt image, given as a path or a MemoryFile."""
+    from PIL import Image
+
+    with Image.open(path.open() if isinstance(path, MemoryFile) else path) as image:
+        image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        pixels = list(
+            image.convert("L")
+            .resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR)
+            .getdata()
+        )
+    value = 0
+    for row in range(HASH_SIZE):
+        for column in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + column]
+            value = value << 1 | (left > pixels[row * (HASH_SIZE + 1) + column + 1])
+    if value.bit_count() < HASH_SIZE:
+        return None
+    return value
+
+
+def _amount(value):
+    """Return an amount of a row in cents, or None if it is empty or not a number."""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    if amount != amount:
+        return None
+    return round(amount * 100)
+
+
+def receipt_key(rows):
+    """Return the key of the receipts parsed from a file, or None if it is incomplete."""
+    dates = set()
+    totals = []
+    items = []
+    for row in rows:
+        if row[1]:
+            dates.add(row[1])
+        if row[-2] == "TOTAL":
+            totals.append(_amount(row[-1]))
+        elif not row[-2]:
+            items.append(_amount(row[-3]))
+    if not dates or not items or not totals or None in totals:
+        return None
+    return (
+        rows[0][0],
+        tuple(sorted(dates)),
+        tuple(sorted(totals)),
+        tuple(sorted(item for item in items if item is not None)),
+    )
+
+
+class DuplicateIndex:
+    """The fingerprints of the receipts seen so far, to tell whether a new one is a copy."""
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = min(max_distance, MAX_DISTANCE)
+        self.digests = {}
+        self.bands = [defaultdict(list) for _ in range(BANDS)]
+        self.keys = {}
+        # The (name, name of the original, reason) of every duplicate found
+        self.duplicates = []
+
+    def __len__(self):
+        return len(self.digests)
+
+    def _bands(self, value):
+        bits = f"{value:0{HASH_SIZE * HASH_SIZE}b}"
+        return [bits[band::BANDS] for band in range(BANDS)]
+
+    def similar_image(self, value, parts=None):
+        """Return the name of the closest indexed image to a hash, and their distance."""
+        best = None, self.max_distance + 1
+        parts = self._bands(value) if parts is None else parts
+        for band, part in zip(self.bands, parts, strict=True):
+            for other, name in band.get(part, ()):
+                distance = (value ^ other).bit_count()
+                if distance < best[1]:
+                    best = name, distance
+        return best if best[0] is not None else (None, None)
+
+    def add_file(self, name, digest, hash_value=None):
+        """Index a file before extraction, returning the name of the file it duplicates or None."""
+        original = self.digests.get(digest)
+        if original is not None:
+            self.duplicates.append((name, original, "same content"))
+            return original
+        if hash_value is not None:
+            parts = self._bands(hash_value)
+            original, distance = self.similar_image(hash_value, parts)
+            if original is not None:
+                self.duplicates.append(
+                    (name, original, f"similar image ({distance} bits apart)")
+                )
+                return original
+        self.digests[digest] = name
+        if hash_value is not None:
+            for band, part in zip(self.bands, parts, strict=True):
+                band[part].append((hash_value, name))
+        return None
+
+    def add_written(self, name, rows):
+        """Index the key of a receipt written before, such as in the workbook appended to."""
+        key = receipt_key(rows)
+        if key is not None:
+            self.keys.setdefault(key, name)
+
+    def add_rows(self, name, rows):
+        """Index the rows parsed from a file, returning the name of the file they copy or None."""
+        key = receipt_key(rows)
+        if key is None:
+            return None
+        original = self.keys.get(key)
+        if original is not None:
+            self.duplicates.append(
+                (name, original, "same store, date, total and items")
+            )
+            return original
+        self.keys[key] = name
+        return None
+
+
+def skip_duplicates(extract_paths, paths, index=None, **options):
+    """Yield the rows of each receipt that is not a duplicate of an earlier one."""
+    index = DuplicateIndex() if index is None else index
+    names = deque()
+
+    def unique_paths():
+        for path in paths:
+            name = file_name(path)
+            digest = content_digest(path)
+            hash_value = None
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                hash_value = image_hash(path)
+            if index.add_file(name, digest, hash_value) is None:
+                names.append(name)
+                yield path
+
+    for rows in extract_paths(unique_paths(), **options):
+        if index.add_rows(names.popleft(), rows) is None:
+            yield rows
+
+
+def print_duplicates(index):
+    """Print the duplicates found in a run, and the receipt each is a copy of."""
+    if not index.duplicates:
+        return
+    print(f"Skipped {len(index.duplicates)} duplicate receipts:")
+    for name, original, reason in index.duplicates:
+        print(f"  {name}: {reason} as {original}")
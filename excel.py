@@ -0,0 +1,473 @@
+import argparse
+import html
+import math
+import os
+import posixpath
+import re
+import resource
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+# The namespaces of the parts of a workbook
+MAIN_NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIPS_NAMESPACE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+)
+PACKAGE_NAMESPACE = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# The columns naming the store and the file of every row, by the names the extractors
+# give them
+STORE_COLUMN = "Store"
+FILE_COLUMNS = ("Filename", "File Name")
+
+# The rows and cells of a worksheet, matched in its XML as bytes
+ROW_PATTERN = re.compile(rb"<row\b[^>]*?\br=\"(\d+)\"")
+CELL_PATTERN = re.compile(rb"<c r=\"([A-Z]+)(\d+)\"([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+TYPE_PATTERN = re.compile(rb"\bt=\"(\w+)\"")
+VALUE_PATTERN = re.compile(rb"<v>(.*?)</v>", re.S)
+TEXT_PATTERN = re.compile(rb"<t(?:\s[^>]*)?>(.*?)</t>", re.S)
+REFERENCE_PATTERN = re.compile(rb"( r=\"[A-Z]*)(\d+)\"")
+DIMENSION_PATTERN = re.compile(rb"<dimension ref=\"([A-Z]+\d+)(?::([A-Z]+)\d+)?\"")
+
+# The characters that cannot be written in the XML of a cell
+ILLEGAL_CHARACTERS = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+
+def cell_value(value):
+    """Return the value to write in a cell: None for a missing number, else the value."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def create_sheet(workbook, title, columns):
+    """Add a sheet to a write-only workbook, with a header styled like DataFrame.to_excel."""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    sheet = workbook.create_sheet(title)
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column)
+        cell.font = Font(bold=True)
+        cell.border = Border(*(Side(style="thin") for _ in range(4)))
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        header.append(cell)
+    sheet.append(header)
+    return sheet
+
+
+def write_rows(path, columns, rows):
+    """Stream rows into a new Excel workbook and return how many were written."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = create_sheet(workbook, "Sheet1", columns)
+
+    count = 0
+    for row in rows:
+        sheet.append([cell_value(value) for value in row])
+        count += 1
+
+    workbook.save(path)
+    return count
+
+
+def write_sheets(path, columns, rows, combined_sheet, sheets=()):
+    """Stream rows into a new workbook, on a combined sheet and a sheet per first value."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    combined = create_sheet(workbook, combined_sheet, columns)
+    by_value = {title: create_sheet(workbook, title, columns) for title in sheets}
+
+    count = 0
+    for row in rows:
+        values = [cell_value(value) for value in row]
+        combined.append(values)
+        sheet = by_value.get(row[0])
+        if sheet is None:
+            sheet = by_value[row[0]] = create_sheet(workbook, str(row[0]), columns)
+        sheet.append(values)
+        count += 1
+
+    workbook.save(path)
+    return count
+
+
+def column_letter(index):
+    """Return the letter of a column given by its index from 0, e.g. AA for 26."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+class WorksheetXml:
+    """The XML of a sheet of an existing workbook, read and updated as bytes."""
+
+    def __init__(self, data, shared_strings):
+        self.data = data
+        self.shared_strings = shared_strings
+        start = data.find(b"<sheetData")
+        if start < 0:
+            raise ValueError("the sheet has no sheetData element")
+        if data.startswith(b"<sheetData/>", start):
+            # An empty sheet: open the element to add the rows into
+            self.data = data = (
+                data[:start] + b"<sheetData></sheetData>" + data[start + 12 :]
+            )
+        self.rows_start = data.index(b">", start) + 1
+        self.rows_end = data.index(b"</sheetData>", self.rows_start)
+        self.header = {}
+        for number, row_start, row_end in self.rows():
+            if number == 1:
+                for match in CELL_PATTERN.finditer(data, row_start, row_end):
+                    self.header[self.cell_text(match)] = match.group(1).decode()
+            break
+        self.file_column = next(
+            (name for name in FILE_COLUMNS if name in self.header), None
+        )
+        if STORE_COLUMN not in self.header or self.file_column is None:
+            raise ValueError("the sheet has no Store or file name column")
+        file_letter = self.header[self.file_column]
+        self.key_pattern = re.compile(
+            rb"<c r=\"(%s|%s)(\d+)\"([^>]*?)(?:/>|>(.*?)</c>)"
+            % (self.header[STORE_COLUMN].encode(), file_letter.encode()),
+            re.S,
+        )
+        self.store_letter = self.header[STORE_COLUMN].encode()
+
+    def cell_text(self, match):
+        """Return the value of a cell matched by CELL_PATTERN, as a string."""
+        attributes, content = match.group(3), match.group(4) or b""
+        if content.startswith(b"<is><t>") and content.endswith(b"</t></is>"):
+            # A plain inline string, as written by write_rows()
+            text = content[7:-9]
+            return html.unescape(text.decode()) if b"&" in text else text.decode()
+        kind = TYPE_PATTERN.search(attributes)
+        kind = kind.group(1) if kind else b"n"
+        if kind == b"inlineStr":
+            text = b"".join(TEXT_PATTERN.findall(content))
+        else:
+            value = VALUE_PATTERN.search(content)
+            text = value.group(1) if value else b""
+            if kind == b"s" and text:
+                return self.shared_strings()[int(text)]
+        return html.unescape(text.decode())
+
+    def rows(self):
+        """Yield the number, start and end in the XML of every row of the sheet."""
+        data, end = self.data, self.rows_end
+        position = data.find(b"<row", self.rows_start, end)
+        while position >= 0:
+            following = data.find(b"<row", position + 4, end)
+            row_end = end if following < 0 else following
+            yield int(ROW_PATTERN.match(data, position).group(1)), position, row_end
+            position = following
+
+    def keys(self):
+        """Yield the number, store and file name of every row with a file name."""
+        # The text of the cells already read, as most repeat on the rows of a receipt
+        texts = {}
+        row, store, name = None, "", ""
+        for match in self.key_pattern.finditer(
+            self.data, self.rows_start, self.rows_end
+        ):
+            letter, number, attributes, content = match.groups()
+            if number != row:
+                if name and row != b"1":
+                    yield int(row), store, name
+                row, store, name = number, "", ""
+            text = texts.get((attributes, content))
+            if text is None:
+                text = texts[attributes, content] = self.cell_text(match)
+            if letter == self.store_letter:
+                store = text
+            else:
+                name = text
+        if name and row != b"1":
+            yield int(row), store, name
+
+    def values(self, columns):
+        """Yield the texts of some columns of every row after the header, as lists."""
+        # The indexes in the lists of the columns, by letter, as one can be given twice
+        indexes = {}
+        for index, column in enumerate(columns):
+            if column in self.header:
+                indexes.setdefault(self.header[column].encode(), []).append(index)
+        if not indexes:
+            return
+        pattern = re.compile(
+            rb"<c r=\"(%s)(\d+)\"([^>]*?)(?:/>|>(.*?)</c>)" % b"|".join(indexes),
+            re.S,
+        )
+        texts = {}
+        row, values = None, None
+        for match in pattern.finditer(self.data, self.rows_start, self.rows_end):
+            letter, number, attributes, content = match.groups()
+            if number != row:
+                if values is not None and row != b"1":
+                    yield values
+                row, values = number, [""] * len(columns)
+            text = texts.get((attributes, content))
+            if text is None:
+                text = texts[attributes, content] = self.cell_text(match)
+            for index in indexes[letter]:
+                values[index] = text
+        if values is not None and row != b"1":
+            yield values
+
+    def last_row(self):
+        """Return the number of the last row of the sheet, 0 if it has none."""
+        end = self.data.rfind(b"<row", self.rows_start, self.rows_end)
+        if end < 0:
+            return 0
+        return int(ROW_PATTERN.match(self.data, end).group(1))
+
+    def updated(self, rows, letters, replaced):
+        """Return the XML of the sheet with rows appended and some receipts removed."""
+        data = self.data
+        parts = [data[: self.rows_start]]
+        position = self.rows_start
+        removed = 0
+        if replaced:
+            removed_rows = {
+                number
+                for number, store, name in self.keys()
+                if (store, name) in replaced
+            }
+            for number, row_start, row_end in self.rows():
+                if number in removed_rows:
+                    parts.append(data[position:row_start])
+                    position = row_end
+                    removed += 1
+                elif removed:
+                    # Only the references of the cells are renumbered, not the formulas
+                    parts.append(data[position:row_start])
+                    parts.append(moved_up(data[row_start:row_end], removed))
+                    position = row_end
+        parts.append(data[position : self.rows_end])
+
+        number = self.last_row() - removed
+        for row in rows:
+            number += 1
+            parts.append(row_xml(number, row, letters))
+        parts.append(data[self.rows_end :])
+        updated = b"".join(parts)
+
+        dimension = DIMENSION_PATTERN.search(updated, 0, self.rows_start)
+        if dimension is not None:
+            last_letter = max(
+                (dimension.group(2) or b"A").decode(),
+                *letters,
+                key=lambda letter: (len(letter), letter),
+            )
+            updated = (
+                updated[: dimension.start()]
+                + b'<dimension ref="%s:%s%d"'
+                % (dimension.group(1), last_letter.encode(), max(number, 1))
+                + updated[dimension.end() :]
+            )
+        return updated
+
+
+def moved_up(row, count):
+    """Return the XML of a row moved up by some rows, with its references renumbered."""
+    return REFERENCE_PATTERN.sub(
+        lambda reference: b'%s%d"'
+        % (reference.group(1), int(reference.group(2)) - count),
+        row,
+    )
+
+
+def row_xml(number, values, letters):
+    """Return the XML of a row of values, each in the column of the given letter."""
+    cells = []
+    for letter, value in zip(letters, values, strict=True):
+        if hasattr(value, "item"):
+            # A numpy scalar, as in the rows of reconcile()
+            value = value.item()
+        value = cell_value(value)
+        reference = f"{letter}{number}"
+        if value is None or value == "":
+            continue
+        if isinstance(value, bool):
+            cells.append(f'<c r="{reference}" t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float)):
+            cells.append(f'<c r="{reference}" t="n"><v>{value!r}</v></c>')
+        else:
+            text = escape(ILLEGAL_CHARACTERS.sub("", str(value)))
+            space = ' xml:space="preserve"' if text != text.strip() else ""
+            cells.append(
+                f'<c r="{reference}" t="inlineStr"><is><t{space}>{text}</t></is></c>'
+            )
+    return f'<row r="{number}">{"".join(cells)}</row>'.encode()
+
+
+class ExistingWorkbook:
+    """A workbook written before, whose sheets are read to append rows to them."""
+
+    def __init__(self, path):
+        import xml.etree.ElementTree as ElementTree
+
+        self.path = path
+        self._shared_strings = None
+        with zipfile.ZipFile(path) as archive:
+            targets = {
+                relationship.get("Id"): relationship.get("Target")
+                for relationship in ElementTree.fromstring(
+                    archive.read("xl/_rels/workbook.xml.rels")
+                ).iter(f"{{{PACKAGE_NAMESPACE}}}Relationship")
+            }
+            self.sheet_parts = {}
+            for sheet in ElementTree.fromstring(archive.read("xl/workbook.xml")).iter(
+                f"{{{MAIN_NAMESPACE}}}sheet"
+            ):
+                target = targets[sheet.get(f"{{{RELATIONSHIPS_NAMESPACE}}}id")]
+                if target.startswith("/"):
+                    part = target[1:]
+                else:
+                    part = posixpath.normpath(posixpath.join("xl", target))
+                self.sheet_parts[sheet.get("name")] = part
+
+    def shared_strings(self):
+        """Return the shared strings of the workbook, read the first time they are needed."""
+        if self._shared_strings is None:
+            import xml.etree.ElementTree as ElementTree
+
+            self._shared_strings = []
+            item_tag = f"{{{MAIN_NAMESPACE}}}si"
+            text_tag = f"{{{MAIN_NAMESPACE}}}t"
+            run_tag = f"{{{MAIN_NAMESPACE}}}r"
+            with zipfile.ZipFile(self.path) as archive:
+                if "xl/sharedStrings.xml" not in archive.namelist():
+                    return self._shared_strings
+                with archive.open("xl/sharedStrings.xml") as file:
+                    for _, element in ElementTree.iterparse(file):
+                        if element.tag != item_tag:
+                            continue
+                        texts = []
+                        for child in element:
+                            if child.tag == run_tag:
+                                child = child.find(text_tag)
+                            if child is not None and child.tag == text_tag:
+                                texts.append(child.text or "")
+                        self._shared_strings.append("".join(texts))
+                        element.clear()
+        return self._shared_strings
+
+    def sheet(self, name=None):
+        """Return a sheet of the workbook, the first one by default, as a WorksheetXml."""
+        if name is None:
+            name = next(iter(self.sheet_parts))
+        if name not in self.sheet_parts:
+            raise ValueError(f"the workbook {self.path} has no sheet {name!r}")
+        with zipfile.ZipFile(self.path) as archive:
+            data = archive.read(self.sheet_parts[name])
+        return WorksheetXml(data, self.shared_strings)
+
+    def receipts(self, name=None):
+        """Return the (store, file name) of the receipts whose rows are in a sheet."""
+        return {(store, file) for _, store, file in self.sheet(name).keys()}
+
+    def receipt_rows(self, columns, name=None):
+        """Return the texts of some columns of the rows of a sheet, by receipt."""
+        sheet = self.sheet(name)
+        receipts = {}
+        for values in sheet.values([STORE_COLUMN, sheet.file_column, *columns]):
+            if values[1]:
+                receipts.setdefault((values[0], values[1]), []).append(values[2:])
+        return receipts
+
+    def replace_sheets(self, sheets):
+        """Write the workbook again with the XML of some sheets replaced, by name."""
+        parts = {self.sheet_parts[name]: data for name, data in sheets.items()}
+        folder = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile(
+            dir=folder, suffix=".xlsx", delete=False
+        ) as file:
+            temporary_path = file.name
+        try:
+            with zipfile.ZipFile(self.path) as source, zipfile.ZipFile(
+                temporary_path, "w"
+            ) as target:
+                for info in source.infolist():
+                    target.writestr(info, parts.get(info.filename) or source.read(info))
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+
+def upsert_rows(path, columns, rows, replaced=(), combined_sheet=None, sheets=()):
+    """Append rows to an existing workbook, replacing the rows of some receipts."""
+    workbook = ExistingWorkbook(path)
+    replaced = set(replaced)
+    if combined_sheet is None:
+        names = [next(iter(workbook.sheet_parts))]
+    else:
+        names = [combined_sheet]
+        names += [name for name in sheets if name in workbook.sheet_parts]
+    sheets = {name: workbook.sheet(name) for name in names}
+    letters = {}
+    for name, sheet in sheets.items():
+        missing = [column for column in columns if column not in sheet.header]
+        if missing:
+            raise ValueError(
+                f"the sheet {name!r} of {path} has no column {', '.join(missing)}"
+            )
+        letters[name] = [sheet.header[column] for column in columns]
+
+    new_rows = {name: [] for name in names}
+    count = 0
+    for row in rows:
+        new_rows[names[0]].append(row)
+        if combined_sheet is not None and row[0] in new_rows:
+            new_rows[row[0]].append(row)
+        count += 1
+
+    workbook.replace_sheets(
+        {
+            name: sheet.updated(new_rows[name], letters[name], replaced)
+            for name, sheet in sheets.items()
+        }
+    )
+    return count
+
+
+def peak_rss_mib():
+    """Return the peak resident memory of this process so far, in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure the peak memory of streaming synthetic rows into Excel."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="numbers of rows to write, one workbook each (default: 10k 100k 1M)",
+    )
+    args = parser.parse_args()
+
+    columns = ["Store", "Date", "Filename", "Description", "Quantité", "Total"]
+    for row_count in args.rows:
+        rows = (
+            ["Canac", "2023-09-01", f"{i}.pdf", f"Article {i}", 1.0, i / 100]
+            for i in range(row_count)
+        )
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "rows.xlsx")
+            write_rows(path, columns, rows)
+            size = os.path.getsize(path) / (1 << 20)
+        print(
+            f"{row_count:>10} rows: {size:8.1f} MiB written, "
+            f"peak RSS {peak_rss_mib():8.1f} MiB"
+        )
@@ -1,179 +1,190 @@
 import os
-import re
-from datetime import datetime
 
-import pandas as pd
 from PyPDF2 import PdfReader
 
+from metrics import count, stage
+from parsing import (
+    SHORT_DATE_PATTERN,
+    RowLayout,
+    find_markers,
+    format_date,
+    get_element,
+    lines_between,
+    text_between,
+)
+from pipeline import extract_files, input_files
+from table import RowTable
 
-def extract_expenses(pdf_folder_path):
-    """Extract tables from PDF files in a folder using PyPDF2."""
+PARSER_VERSION = 3
+
+# The files extracted, by extension
+EXTENSIONS = (".pdf",)
+
+# The markers of the sections of a receipt
+MARKERS = ("VENTE CAISSIER", "CODE D'AUT", "SOUS-TOTAL", "CAD$")
+
+# The markers starting a receipt, its totals and the end of its totals
+RECEIPT_START = "VENTE CAISSIER"
+TOTALS_START = "SOUS-TOTAL"
+TOTALS_END = "CAD$"
+
+ROWS = RowLayout("Home Depot")
+
+COLUMNS = [
+    "Store",
+    "Date",
+    "File Name",
+    "Item Code",
+    "Description",
+    "Quantity",
+    "Unit Price",
+    "Total",
+    "TextSum",
+    "Sum",
+]
+
+
+def parse_text(text, pdf_filename):
+    """Parse the text of a receipt into rows."""
     tabulated_data = []
+    lines = text.split("\n")
+    markers = find_markers(text, MARKERS)
 
-    # Loop through each PDF file in the folder
-    for pdf_filename in os.listdir(pdf_folder_path):
-        if pdf_filename.endswith(".pdf") or pdf_filename.endswith(".PDF"):
-            pdf_path = os.path.join(pdf_folder_path, pdf_filename)
-
-            # Read the PDF
-            with open(pdf_path, "rb") as pdf_file:
-                pdf_reader = PdfReader(pdf_file)
-                page = pdf_reader.pages[0]
-                text = page.extract_text()
-
-                # Extract and format the date from the 3rd line of the entire text
-                raw_date_line = text.split("\n")[2].strip()
-                raw_date_match = re.search(r"(\d{2}-\d{2}-\d{2})", raw_date_line)
-                if raw_date_match:
-                    raw_date = raw_date_match.group(1)
-                    formatted_date = datetime.strptime(raw_date, "%d-%m-%y").strftime(
-                        "%Y-%m-%d"
-                    )
-                else:
-                    formatted_date = "Unknown Date"
-
-                # Extract lines between "VENTE CAISSIER" and "CODE D'AUT"
-                start = text.find("VENTE CAISSIER")
-                end = text.find("CODE D'AUT")
-                relevant_lines = text[start:end].split("\n")[1:-1]
-
-                i = 0
-                while i < len(relevant_lines):
-                    line = relevant_lines[i]
-                    if "<A>" in line:
-                        item_code = line[:14].strip()
-                        description = line[14:].split("<A>")[0].strip()
-                        next_line_index = i + 1
-                        if (
-                            next_line_index < len(relevant_lines)
-                            and "@" in relevant_lines[next_line_index]
-                        ):
-                            quantity, unit_price = relevant_lines[
-                                next_line_index
-                            ].split("@")
-                            total = (
-                                relevant_lines[next_line_index]
-                                .split()[-1]
-                                .replace(",", ".")
-                            )
-                            unit_price = unit_price.split()[0].replace(",", ".")
-                            i += 1
-                        else:
-                            quantity = 1
-                            unit_price = line.split("<A>")[-1].replace(",", ".")
-                            total = unit_price
-                        tabulated_data.append(
-                            [
-                                "Home Depot",
-                                formatted_date,
-                                pdf_filename,
-                                item_code,
-                                description,
-                                quantity,
-                                unit_price,
-                                total,
-                                "",
-                                "",
-                            ]
-                        )
-                    i += 1
-
-                # Extract amounts for SOUS-TOTAL, TPS/TVH, TVP/TVQ, and TOTAL
-                total_start = text.find("SOUS-TOTAL")
-                total_end = text.find("CAD$")
-                total_info = text[total_start:total_end].split("\n")
-
-                sous_total = total_info[0].split()[-1].replace(",", ".")
-                tps_tvh = total_info[1].split()[-1].replace(",", ".")
-                tvp_tvq = total_info[2].split()[-1].replace(",", ".")
-                total = total_info[3].split()[-1].replace(",", ".")
-
-                # Add amounts to the tabulated data
-                tabulated_data.append(
-                    [
-                        "Home Depot",
-                        formatted_date,
-                        pdf_filename,
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "SOUS TOTAL",
-                        sous_total,
-                    ]
-                )
-                tabulated_data.append(
-                    [
-                        "Home Depot",
-                        formatted_date,
-                        pdf_filename,
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "TPS/TVH",
-                        tps_tvh,
-                    ]
-                )
-                tabulated_data.append(
-                    [
-                        "Home Depot",
-                        formatted_date,
-                        pdf_filename,
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "TVP/TVQ",
-                        tvp_tvq,
-                    ]
-                )
-                tabulated_data.append(
-                    [
-                        "Home Depot",
-                        formatted_date,
-                        pdf_filename,
-                        "",
-                        "",
-                        "",
-                        "",
-                        "",
-                        "TOTAL",
-                        total,
-                    ]
+    # Extract and format the date from the 3rd line of the entire text
+    raw_date_match = SHORT_DATE_PATTERN.search(lines[2])
+    if raw_date_match:
+        formatted_date = format_date(raw_date_match.group(), "%d-%m-%y")
+    else:
+        formatted_date = "Unknown Date"
+
+    # Extract lines between "VENTE CAISSIER" and "CODE D'AUT"
+    relevant_lines = lines_between(lines, markers, "VENTE CAISSIER", "CODE D'AUT")
+
+    i = 0
+    while i < len(relevant_lines):
+        line = relevant_lines[i]
+        if "<A>" in line:
+            item_code = line[:14].strip()
+            description = line[14:].partition("<A>")[0].strip()
+            next_line_index = i + 1
+            if (
+                next_line_index < len(relevant_lines)
+                and "@" in relevant_lines[next_line_index]
+            ):
+                quantity, unit_price = relevant_lines[next_line_index].split("@")
+                total = relevant_lines[next_line_index].split()[-1].replace(",", ".")
+                unit_price = unit_price.split()[0].replace(",", ".")
+                i += 1
+            else:
+                quantity = 1
+                unit_price = line.rsplit("<A>", 1)[-1].replace(",", ".")
+                total = unit_price
+            tabulated_data.append(
+                ROWS.item_row(
+                    formatted_date,
+                    pdf_filename,
+                    item_code,
+                    description,
+                    quantity,
+                    unit_price,
+                    total,
                 )
+            )
+        i += 1
 
-    # Create a DataFrame and save it to an Excel file
-    data_table = pd.DataFrame(
-        tabulated_data,
-        columns=[
-            "Store",
-            "Date",
-            "File Name",
-            "Item Code",
-            "Description",
-            "Quantity",
-            "Unit Price",
-            "Total",
-            "TextSum",
-            "Sum",
-        ],
-    )
-    data_table["Quantity"] = pd.to_numeric(data_table["Quantity"], errors="coerce")
-    data_table["Unit Price"] = pd.to_numeric(data_table["Unit Price"], errors="coerce")
-    data_table["Total"] = pd.to_numeric(
-        data_table["Total"].str.replace("$", ""), errors="coerce"
-    )
-    data_table["Sum"] = pd.to_numeric(
-        data_table["Sum"].str.replace("$", ""), errors="coerce"
+    # Extract amounts for SOUS-TOTAL, TPS/TVH, TVP/TVQ, and TOTAL
+    total_info = text_between(lines, markers, "SOUS-TOTAL", "CAD$")
+
+    # Add amounts to the tabulated data, None for those missing from the totals
+    for index, text_sum in enumerate(["SOUS TOTAL", "TPS/TVH", "TVP/TVQ", "TOTAL"]):
+        words = (get_element(total_info, index) or "").split()
+        amount = words[-1].replace(",", ".") if words else None
+        tabulated_data.append(
+            ROWS.sum_row(formatted_date, pdf_filename, text_sum, amount)
+        )
+
+    return tabulated_data
+
+
+def _totals_ended(text):
+    """Return whether the text of a receipt goes up to the end of its totals."""
+    totals = text.find(TOTALS_START)
+    return totals >= 0 and text.find(TOTALS_END, totals) >= 0
+
+
+def extract_file(pdf_path, file_name=None, pages=None):
+    """Extract the rows of every receipt of one PDF file using PyPDF2."""
+    pdf_file_name = file_name or os.path.basename(pdf_path)
+    with stage("open"):
+        reader_pages = PdfReader(pdf_path).pages
+    start, stop = (0, len(reader_pages)) if pages is None else pages
+    texts = {}
+
+    def page_text(index):
+        if index not in texts:
+            with stage("extract_text"):
+                texts[index] = reader_pages[index].extract_text()
+        return texts[index]
+
+    # Go back to the start of the receipt the first page may belong to
+    first = start
+    while first > 0:
+        first -= 1
+        if RECEIPT_START in page_text(first):
+            break
+
+    receipts = []
+    receipt = None
+    ended = True
+    for index in range(first, len(reader_pages)):
+        if index >= stop and ended:
+            break
+        if start <= index < stop:
+            count("pages")
+        text = page_text(index)
+        if RECEIPT_START in text or (ended and TOTALS_START in text):
+            if index >= stop:
+                break
+            receipt = [text]
+            if index >= start:
+                receipts.append(receipt)
+        elif not ended and text.strip():
+            receipt.append(text)
+        else:
+            continue
+        ended = _totals_ended("\n".join(receipt))
+
+    rows = []
+    with stage("parse"):
+        for receipt in receipts:
+            rows.extend(parse_text("\n".join(receipt), pdf_file_name))
+    return rows
+
+
+def extract_paths(pdf_paths, workers=1, cache=None, metrics=None):
+    """Yield the rows extracted from each PDF file using PyPDF2, in the order of the paths."""
+    return extract_files(
+        extract_file, pdf_paths, workers, cache, metrics=metrics, split_pages=True
     )
 
-    return data_table
 
+def iter_rows(pdf_folder_path, workers=1, cache=None, metrics=None):
+    """Yield the rows extracted from the PDF files in a folder using PyPDF2."""
+    pdf_paths = input_files(pdf_folder_path, EXTENSIONS)
+    for rows in extract_paths(pdf_paths, workers, cache, metrics):
+        yield from rows
+
+
+def extract_expenses(pdf_folder_path, workers=1, cache=None):
+    """Extract tables from PDF files in a folder using PyPDF2."""
+    data_table = RowTable(COLUMNS)
+    data_table.extend(iter_rows(pdf_folder_path, workers, cache))
+    return data_table.to_frame()
+
+
+if __name__ == "__main__":
+    import sys
+
+    import receipts
 
-results = extract_expenses("receipts/HomeDepot")
-results.to_excel("receipts/home-depot_data.xlsx", index=False)
-print("Tabulated data has been saved to 'home-depot_data.xlsx'")
+    receipts.main(["home-depot", *sys.argv[1:]])
@@ -0,0 +1,25 @@
+from functools import partial
+
+import home_depot
+import home_depot_scanned
+import router
+
+PARSER_VERSION = router.parser_version(home_depot, home_depot_scanned)
+
+COLUMNS = home_depot.COLUMNS
+
+# The files extracted, by extension
+EXTENSIONS = router.EXTENSIONS
+
+# PDFs with a text layer are parsed like home_depot.py does, and the other receipts
+# recognised like home_depot_scanned.py does, see router.extract_paths()
+extract_paths = partial(router.extract_paths, "home_depot", "home_depot_scanned")
+iter_rows = partial(router.iter_rows, "home_depot", "home_depot_scanned")
+
+
+if __name__ == "__main__":
+    import sys
+
+    import receipts
+
+    receipts.main(["home-depot-auto", *sys.argv[1:]])
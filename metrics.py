@@ -0,0 +1,195 @@
+import contextlib
+import json
+import time
+
+from archive import file_name, file_size
+
+# The record of the file being extracted in this process, while metrics are collected
+_current = None
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+class _Stage:
+    """Add the wall time spent in a block to a stage of the current file record."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        stages = _current["stages"]
+        stages[self.name] = (
+            stages.get(self.name, 0.0) + time.perf_counter() - self.start
+        )
+
+
+def stage(name):
+    """Return a context manager timing a stage of the extraction of the current file."""
+    if _current is None:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+def count(name, amount=1):
+    """Add to a counter of the current file record, e.g. its pages or images."""
+    if _current is not None:
+        _current[name] = _current.get(name, 0) + amount
+
+
+def measured(extract_file, path, *args):
+    """Extract a file while recording its metrics, returning its rows and its record."""
+    global _current
+    _current = {
+        "file": file_name(path),
+        "bytes": file_size(path),
+        "stages": {},
+    }
+    start = time.perf_counter()
+    try:
+        rows = extract_file(path, *args)
+    finally:
+        record, _current = _current, None
+    record["wall"] = time.perf_counter() - start
+    record["rows"] = len(rows)
+    return rows, record
+
+
+def recorded(function, *args):
+    """Call a function while recording its stages and counters, returning its result and them."""
+    global _current
+    _current = {"stages": {}}
+    try:
+        result = function(*args)
+    finally:
+        record, _current = _current, None
+    return result, record
+
+
+def merge_records(records):
+    """Return the record of a file extracted in parts, from the records of its parts."""
+    if len(records) == 1:
+        return records[0]
+    record = {**records[0], "stages": dict(records[0]["stages"])}
+    for part in records[1:]:
+        for name, seconds in part["stages"].items():
+            record["stages"][name] = record["stages"].get(name, 0.0) + seconds
+        for name in ("wall", "rows", "pages", "images", "ocr_cached", "escalated"):
+            if name in part:
+                record[name] = record.get(name, 0) + part[name]
+    record["parts"] = len(records)
+    return record
+
+
+class Metrics:
+    """Per-file and per-stage metrics of a run, summarized at its end."""
+
+    def __init__(self, path=None, slowest=5):
+        self.path = path
+        self.slowest = slowest
+        self.records = []
+        self.stages = {}
+        # The statistics of the queues of the asyncio pipeline, by stage
+        self.queues = {}
+        self.start = time.perf_counter()
+
+    def add(self, record):
+        """Add the record of a file, extracted or read back from a cache."""
+        self.records.append(record)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a stage of the run, outside of the extraction of the files."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def timed(self, items, name):
+        """Yield the items, adding the time spent waiting for each to a stage."""
+        items = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                self.stages[name] = (
+                    self.stages.get(name, 0.0) + time.perf_counter() - start
+                )
+            yield item
+
+    def summary(self):
+        """Return the totals of the run, its stage times and its slowest files."""
+        file_stages = {}
+        totals = {"files": len(self.records)}
+        for record in self.records:
+            for name, seconds in record["stages"].items():
+                file_stages[name] = file_stages.get(name, 0.0) + seconds
+            for name in (
+                "bytes",
+                "pages",
+                "images",
+                "ocr_cached",
+                "escalated",
+                "rows",
+                "cached",
+            ):
+                totals[name] = totals.get(name, 0) + record.get(name, 0)
+        wall = time.perf_counter() - self.start
+        slowest = sorted(
+            (record for record in self.records if "wall" in record),
+            key=lambda record: record["wall"],
+            reverse=True,
+        )[: self.slowest]
+        return {
+            "type": "summary",
+            "wall": wall,
+            **totals,
+            "files_per_second": totals["files"] / wall if wall else 0.0,
+            "file_stages": file_stages,
+            "run_stages": dict(self.stages),
+            "queues": self.queues,
+            "slowest": [
+                {"file": record["file"], "wall": record["wall"]} for record in slowest
+            ],
+        }
+
+    def report(self):
+        """Print the summary table, and write the records and summary as JSON lines."""
+        summary = self.summary()
+        print(
+            f"\n{summary['files']} files ({summary['cached']} from the cache), "
+            f"{summary['pages']} pages, {summary['images']} images "
+            f"({summary['ocr_cached']} more from the OCR cache, "
+            f"{summary['escalated']} receipts escalated), "
+            f"{summary['bytes'] / (1 << 20):.1f} MiB read, {summary['rows']} rows "
+            f"in {summary['wall']:.2f} s ({summary['files_per_second']:.1f} files/s)"
+        )
+        print(f"{'stage':<16}{'seconds':>10}{'per file':>12}")
+        for name, seconds in {
+            **summary["file_stages"],
+            **summary["run_stages"],
+        }.items():
+            per_file = (
+                f"{1000 * seconds / summary['files']:.1f} ms"
+                if name in summary["file_stages"] and summary["files"]
+                else ""
+            )
+            print(f"{name:<16}{seconds:>10.2f}{per_file:>12}")
+        if summary["slowest"]:
+            print(f"Slowest {len(summary['slowest'])} files:")
+            for record in summary["slowest"]:
+                print(f"  {record['wall']:8.2f} s  {record['file']}")
+
+        if self.path:
+            with open(self.path, "w", encoding="utf-8") as file:
+                for record in self.records:
+                    file.write(json.dumps({"type": "file", **record}) + "\n")
+                file.write(json.dumps(summary) + "\n")
@@ -0,0 +1,353 @@
+import argparse
+import hashlib
+import os
+import time
+from io import BytesIO
+
+from metrics import count, stage
+
+BACKENDS = ("pytesseract", "tesserocr")
+
+# How much smaller the image of the layout pass of recognize_regions() is, per side.
+LAYOUT_REDUCTION = 3
+
+# The mean word confidence, from 0 to 100, below which escalate() tries the next attempt
+MIN_CONFIDENCE = 70
+
+_engine = None
+_text_cache = None
+_engine_version = None
+
+
+class PytesseractEngine:
+    """Run a new tesseract process for every image, through pytesseract."""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+
+        self._pytesseract = pytesseract
+
+    def image_to_string(self, image, psm=None):
+        """Return the text recognised in a PIL image."""
+        config = f"--oem 3 --psm {psm}" if psm is not None else ""
+        return self._pytesseract.image_to_string(image, config=config)
+
+    def image_to_string_with_confidence(self, image, psm=None):
+        """Return the text recognised in a PIL image and the mean confidence of its words."""
+        config = f"--oem 3 --psm {psm}" if psm is not None else ""
+        data = self._pytesseract.image_to_data(
+            image, config=config, output_type=self._pytesseract.Output.DICT
+        )
+        text = []
+        confidences = []
+        previous = None
+        for i, word in enumerate(data["text"]):
+            if not word.strip():
+                continue
+            paragraph = (data["block_num"][i], data["par_num"][i])
+            line = (*paragraph, data["line_num"][i])
+            if previous is not None:
+                if paragraph != previous[:2]:
+                    text.append("\n\n")
+                elif line != previous:
+                    text.append("\n")
+                else:
+                    text.append(" ")
+            text.append(word)
+            confidences.append(float(data["conf"][i]))
+            previous = line
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return "".join(text) + "\n", confidence
+
+    def version(self):
+        """Return the version of the tesseract executable run."""
+        return str(self._pytesseract.get_tesseract_version())
+
+    def image_to_lines(self, image, psm=None):
+        """Return the lines recognised in a PIL image, as (text, top, bottom) tuples."""
+        config = f"--oem 3 --psm {psm}" if psm is not None else ""
+        data = self._pytesseract.image_to_data(
+            image, config=config, output_type=self._pytesseract.Output.DICT
+        )
+        lines = {}
+        for i, word in enumerate(data["text"]):
+            if not word.strip():
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            top = data["top"][i]
+            bottom = top + data["height"][i]
+            if key in lines:
+                words, line_top, line_bottom = lines[key]
+                lines[key] = (
+                    words + [word],
+                    min(top, line_top),
+                    max(bottom, line_bottom),
+                )
+            else:
+                lines[key] = ([word], top, bottom)
+        return [(" ".join(words), top, bottom) for words, top, bottom in lines.values()]
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    """Recognise images with one tesseract API handle kept loaded in this process."""
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+
+        self._tesserocr = tesserocr
+        self._api = tesserocr.PyTessBaseAPI()
+        self._default_psm = self._api.GetPageSegMode()
+
+    def image_to_string(self, image, psm=None):
+        """Return the text recognised in a PIL image."""
+        self._api.SetPageSegMode(self._default_psm if psm is None else psm)
+        self._api.SetImage(image)
+        return self._api.GetUTF8Text()
+
+    def image_to_string_with_confidence(self, image, psm=None):
+        """Return the text recognised in a PIL image and the mean confidence of its words."""
+        text = self.image_to_string(image, psm)
+        return text, float(self._api.MeanTextConf())
+
+    def version(self):
+        """Return the version of the tesseract library loaded."""
+        return self._tesserocr.tesseract_version().split()[1]
+
+    def image_to_lines(self, image, psm=None):
+        """Return the lines recognised in a PIL image, as (text, top, bottom) tuples."""
+        self._api.SetPageSegMode(self._default_psm if psm is None else psm)
+        self._api.SetImage(image)
+        self._api.Recognize()
+        level = self._tesserocr.RIL.TEXTLINE
+        lines = []
+        for line in self._tesserocr.iterate_level(self._api.GetIterator(), level):
+            text = line.GetUTF8Text(level)
+            box = line.BoundingBox(level)
+            if text and text.strip() and box:
+                lines.append((text.strip(), box[1], box[3]))
+        return lines
+
+    def close(self):
+        self._api.End()
+
+
+def create_engine(backend):
+    """Create the OCR engine of a backend, falling back to pytesseract if it is missing."""
+    if backend == "tesserocr":
+        try:
+            return TesserocrEngine()
+        except ImportError:
+            print("tesserocr is not installed, falling back to pytesseract")
+    return PytesseractEngine()
+
+
+def limit_threads(threads):
+    """Limit the number of threads each tesseract run uses, or leave its default."""
+    if threads:
+        os.environ["OMP_THREAD_LIMIT"] = str(threads)
+
+
+def worker_threads(workers):
+    """Return the tesseract thread limit to use when OCR runs on that many workers."""
+    return 1 if workers > 1 else None
+
+
+def init_worker(backend, threads=None, text_cache=None):
+    """Set up the OCR engine, and the text cache if any, of the current process."""
+    global _engine, _engine_version, _text_cache
+    limit_threads(threads)
+    if _engine is not None:
+        _engine.close()
+    _engine = create_engine(backend)
+    _engine_version = None
+    if _text_cache is not None:
+        _text_cache.close()
+        _text_cache = None
+    if text_cache is not None:
+        from cache import TextCache
+
+        _text_cache = TextCache(*text_cache)
+
+
+def engine_version():
+    """Return the backend and tesseract version of the engine of the current process."""
+    global _engine, _engine_version
+    if _engine is None:
+        _engine = PytesseractEngine()
+    if _engine_version is None:
+        _engine_version = f"{_engine.name} {_engine.version()}"
+    return _engine_version
+
+
+def text_key(image_file, settings, *options):
+    """Return the key of the text of an image file recognised with some settings."""
+    if isinstance(image_file, BytesIO):
+        digest = hashlib.sha256(image_file.getbuffer()).hexdigest()
+    else:
+        from cache import file_digest
+
+        digest = file_digest(image_file)
+    return repr((digest, settings, *options, engine_version()))
+
+
+def recognize_file(
+    image_file,
+    prepare,
+    settings,
+    find_regions=None,
+    psm=None,
+    reduction=1,
+    confidence=False,
+):
+    """Return the text of an image file and its confidence, from the text cache or OCR."""
+    key = None
+    if _text_cache is not None:
+        key = text_key(
+            image_file,
+            settings,
+            psm,
+            find_regions is not None,
+            reduction,
+            confidence,
+        )
+        found = _text_cache.get(key)
+        if found is not None:
+            count("ocr_cached")
+            return found
+
+    if isinstance(image_file, BytesIO):
+        image_file.seek(0)
+    with stage("preprocess"):
+        image = prepare(image_file)
+        if reduction > 1:
+            image = image.reduce(reduction)
+    count("images")
+    with stage("ocr"):
+        if find_regions is not None:
+            text, text_confidence = recognize_regions(image, find_regions, psm), None
+        elif confidence:
+            text, text_confidence = image_to_string_with_confidence(image, psm)
+        else:
+            text, text_confidence = image_to_string(image, psm), None
+    # Only the text is needed from here on, release the image
+    del image
+
+    if key is not None:
+        _text_cache.put(key, text, text_confidence)
+    return text, text_confidence
+
+
+def escalate(attempts, parse, is_complete, min_confidence=MIN_CONFIDENCE):
+    """Run OCR attempts, from the cheapest, until one is parsed completely and confidently."""
+    best = None
+    for level, attempt in enumerate(attempts):
+        text, confidence = attempt()
+        with stage("parse"):
+            rows = parse(text)
+        complete = is_complete(rows)
+        if complete and (confidence is None or confidence >= min_confidence):
+            if level:
+                count("escalated")
+            return rows
+        score = (complete, -1 if confidence is None else confidence)
+        if best is None or score > best[0]:
+            best = (score, rows)
+    if len(attempts) > 1:
+        count("escalated")
+    return best[1]
+
+
+def image_to_string(image, psm=None):
+    """Return the text recognised in a PIL image by the engine of the current process."""
+    global _engine
+    if _engine is None:
+        _engine = PytesseractEngine()
+    return _engine.image_to_string(image, psm)
+
+
+def image_to_string_with_confidence(image, psm=None):
+    """Return the text recognised in a PIL image and the mean confidence of its words."""
+    global _engine
+    if _engine is None:
+        _engine = PytesseractEngine()
+    return _engine.image_to_string_with_confidence(image, psm)
+
+
+def image_to_lines(image, psm=None):
+    """Return the (text, top, bottom) lines recognised in a PIL image."""
+    global _engine
+    if _engine is None:
+        _engine = PytesseractEngine()
+    return _engine.image_to_lines(image, psm)
+
+
+def recognize_regions(image, find_regions, psm=None, reduction=LAYOUT_REDUCTION):
+    """Return the text of the parts of a PIL image holding what is to be parsed."""
+    lines = image_to_lines(image.reduce(reduction), psm)
+    regions = find_regions([text for text, _, _ in lines]) if lines else None
+    if not regions:
+        return image_to_string(image, psm)
+
+    heights = sorted(bottom - top for _, top, bottom in lines)
+    margin = reduction * heights[len(heights) // 2] // 2
+    bands = []
+    for top, bottom in sorted(
+        (
+            max(lines[first][1] * reduction - margin, 0),
+            min(lines[last][2] * reduction + margin, image.height),
+        )
+        for first, last in regions
+    ):
+        if bands and top <= bands[-1][1]:
+            bands[-1] = (bands[-1][0], max(bottom, bands[-1][1]))
+        else:
+            bands.append((top, bottom))
+
+    return "\n".join(
+        image_to_string(image.crop((0, top, image.width, bottom)), psm)
+        for top, bottom in bands
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the OCR time of the backends on the same images."
+    )
+    parser.add_argument("folder", help="folder holding the .jpg/.jpeg images")
+    parser.add_argument(
+        "--psm", type=int, default=None, help="tesseract page segmentation mode"
+    )
+    args = parser.parse_args()
+
+    from PIL import Image
+
+    from pipeline import list_files
+
+    image_paths = [
+        os.path.join(args.folder, file_name)
+        for file_name in list_files(args.folder, (".jpg", ".jpeg"))
+    ]
+    for backend in BACKENDS:
+        engine = create_engine(backend)
+        if engine.name != backend:
+            continue
+        timings = []
+        for image_path in image_paths:
+            with Image.open(image_path) as image:
+                image = image.convert("L")
+                start = time.perf_counter()
+                engine.image_to_string(image, args.psm)
+                timings.append(time.perf_counter() - start)
+        engine.close()
+        total = sum(timings)
+        print(
+            f"{backend:>12}: {len(timings)} images in {total:.2f} s, "
+            f"{1000 * total / max(len(timings), 1):.0f} ms per image"
+        )
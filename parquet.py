@@ -0,0 +1,193 @@
+import math
+import os
+import uuid
+from datetime import date
+from itertools import islice
+
+from table import to_number
+
+# The columns holding amounts of money, stored as decimals with 2 digits
+MONEY_COLUMNS = ("Prix Unité", "Unit Price", "Total", "Sum", "Items Sum")
+MONEY_PRECISION = 12
+
+# The columns holding quantities, stored as floats
+QUANTITY_COLUMNS = ("Quantité", "Quantity")
+
+# The columns holding flags, stored as booleans
+BOOLEAN_COLUMNS = ("Inferred",)
+
+# The column holding the digest of the content of the file of every row, which identifies
+# its receipt across runs
+DIGEST_COLUMN = "File Digest"
+
+# The number of rows converted and written at once
+BATCH_SIZE = 65_536
+
+
+def column_type(column):
+    """Return the Arrow type a column of the extracted rows is stored as."""
+    import pyarrow as pa
+
+    if column == "Store":
+        return pa.dictionary(pa.int32(), pa.string())
+    if column == "Date":
+        return pa.date32()
+    if column in MONEY_COLUMNS:
+        return pa.decimal128(MONEY_PRECISION, 2)
+    if column in QUANTITY_COLUMNS:
+        return pa.float64()
+    if column in BOOLEAN_COLUMNS:
+        return pa.bool_()
+    return pa.string()
+
+
+def parse_date(value):
+    """Return the date of a YYYY-MM-DD string, or None for "Unknown Date" and the like."""
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value):
+    """Return a parsed value as a float, or None when it is not a number."""
+    number = to_number(value)
+    return None if math.isnan(number) else number
+
+
+def to_text(value):
+    """Return a parsed value as a string, or None when it is missing."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value)
+
+
+def record_batch(schema, columns, rows, digests):
+    """Convert rows given as sequences of values in column order into a typed batch."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = list(zip(*rows, strict=True))
+    arrays = []
+    for column, column_values in zip(columns, values, strict=True):
+        arrow_type = schema.field(column).type
+        if column == "Date":
+            dates = pa.array(map(parse_date, column_values), pa.date32())
+            arrays.append(dates)
+        elif column in MONEY_COLUMNS:
+            amounts = pc.round(pa.array(map(to_float, column_values), pa.float64()), 2)
+            arrays.append(amounts.cast(arrow_type, safe=False))
+        elif column in QUANTITY_COLUMNS:
+            arrays.append(pa.array(map(to_float, column_values), arrow_type))
+        elif column in BOOLEAN_COLUMNS:
+            arrays.append(pa.array(map(bool, column_values), arrow_type))
+        elif column == "Store":
+            arrays.append(pa.array(map(to_text, column_values)).dictionary_encode())
+        else:
+            arrays.append(pa.array(map(to_text, column_values), arrow_type))
+    arrays.append(pa.array(digests, pa.string()))
+    arrays.append(pc.year(dates).cast(pa.int16()))
+    arrays.append(pc.month(dates).cast(pa.int8()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def remove_receipts(folders, digests, receipts, columns, kept_files=()):
+    """Remove the rows of some receipts from the files of some folders of a dataset."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for folder in folders:
+        for name in os.listdir(folder):
+            path = os.path.normpath(os.path.join(folder, name))
+            if not name.endswith(".parquet") or path in kept_files:
+                continue
+            file = pq.ParquetFile(path)
+            key_columns = [columns[0], columns[2]]
+            has_digests = DIGEST_COLUMN in file.schema_arrow.names
+            if has_digests:
+                key_columns.append(DIGEST_COLUMN)
+            keys = file.read(columns=key_columns)
+            stores, names = keys.column(0).to_pylist(), keys.column(1).to_pylist()
+            if has_digests:
+                file_digests = keys.column(2).to_pylist()
+            else:
+                file_digests = [None] * len(stores)
+            kept = [
+                (
+                    digest not in digests
+                    if digest is not None
+                    else (store, name) not in receipts
+                )
+                for store, name, digest in zip(stores, names, file_digests, strict=True)
+            ]
+            if all(kept):
+                continue
+            if not any(kept):
+                os.remove(path)
+                continue
+            table = file.read().filter(pa.array(kept))
+            pq.write_table(table, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+
+def write_rows(folder, columns, rows, digest_of=None):
+    """Write rows into a Parquet dataset partitioned by year and month of their dates."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    schema = pa.schema(
+        [(column, column_type(column)) for column in columns]
+        + [(DIGEST_COLUMN, pa.string()), ("year", pa.int16()), ("month", pa.int8())]
+    )
+    count = 0
+    # The digests and the (store, file name) of the receipts written
+    digests = set()
+    receipts = set()
+    written_files = set()
+
+    def batches():
+        nonlocal count
+        rows_iterator = iter(rows)
+        while batch := list(islice(rows_iterator, BATCH_SIZE)):
+            count += len(batch)
+            batch_digests = [
+                None if digest_of is None else digest_of(row) for row in batch
+            ]
+            digests.update(batch_digests)
+            receipts.update((row[0], row[2]) for row in batch)
+            yield record_batch(schema, columns, batch, batch_digests)
+
+    ds.write_dataset(
+        batches(),
+        folder,
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive"
+        ),
+        existing_data_behavior="overwrite_or_ignore",
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        file_visitor=lambda file: written_files.add(os.path.normpath(file.path)),
+    )
+    digests.discard(None)
+    folders = {os.path.dirname(path) for path in written_files}
+    remove_receipts(folders, digests, receipts, columns, written_files)
+    return count
+
+
+def read_month(folder, year, month):
+    """Read the rows of one month of a dataset as a DataFrame, reading only its files."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(
+        folder,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive"
+        ),
+    )
+    table = dataset.to_table(
+        filter=(ds.field("year") == year) & (ds.field("month") == month)
+    )
+    return table.to_pandas()
@@ -0,0 +1,202 @@
+import argparse
+import importlib
+import math
+import os
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from table import to_number
+
+# Dates as printed on the receipts
+SHORT_DATE_PATTERN = re.compile(r"\d{2}-\d{2}-\d{2}")
+LONG_DATE_PATTERN = re.compile(r"\d{4}/\d{2}/\d{2}")
+
+# The first number of a string, with a comma or a period as decimal separator
+NUMBER_PATTERN = re.compile(r"\d+[\s]*[,\.]?[\s]*\d*")
+
+
+def get_element(a_list, index):
+    """Return the element at the given index if it exists, otherwise return None."""
+    return a_list[index] if index < len(a_list) else None
+
+
+def extract_numeric_value(text):
+    """Extract the first numeric value from a string, or None."""
+    if not text:
+        return None
+    match = NUMBER_PATTERN.search(text)
+    if match is None:
+        return None
+    # Replace commas with periods for decimal numbers and remove spaces
+    return float(match.group().replace(",", ".").replace(" ", ""))
+
+
+@lru_cache(maxsize=4096)
+def format_date(raw_date, *formats):
+    """Format a raw date as YYYY-MM-DD, trying the formats in turn."""
+    for date_format in formats[:-1]:
+        try:
+            return datetime.strptime(raw_date, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return datetime.strptime(raw_date, formats[-1]).strftime("%Y-%m-%d")
+
+
+def has_date_and_total(rows):
+    """Return whether the rows parsed from a receipt hold its date and its total."""
+    if not rows or rows[0][1] == "Unknown Date":
+        return False
+    return any(
+        row[-2] in ("SOUS TOTAL", "TOTAL")
+        and isinstance(row[-1], (int, float))
+        and row[-1] == row[-1]
+        for row in rows
+    )
+
+
+class Row(list):
+    """A row of an extractor, its values in column order and its file name a string."""
+
+    __slots__ = ()
+
+    def __init__(self, values):
+        super().__init__(values)
+        if not isinstance(self[2], str):
+            raise TypeError(f"File name of a row is a {type(self[2]).__name__}")
+
+    @property
+    def file_name(self):
+        """The name of the file of the receipt of the row."""
+        return self[2]
+
+
+class RowLayout:
+    """The layout of the rows of an extractor, built with typed values."""
+
+    __slots__ = ("store", "unit", "_empty_item")
+
+    def __init__(self, store, unit=False):
+        self.store = store
+        self.unit = unit
+        self._empty_item = (
+            ("", "", math.nan) + (("",) if unit else ()) + (math.nan,) * 2
+        )
+
+    def item_row(
+        self,
+        date,
+        file_name,
+        item_code,
+        description,
+        quantity,
+        unit_price,
+        total,
+        unit="",
+    ):
+        """Return the row of an item, its numbers converted to floats."""
+        try:
+            numbers = float(quantity), float(unit_price), float(total)
+        except (TypeError, ValueError):
+            numbers = to_number(quantity), to_number(unit_price), to_number(total)
+        if self.unit:
+            return [
+                self.store,
+                date,
+                file_name,
+                item_code,
+                description,
+                numbers[0],
+                unit,
+                numbers[1],
+                numbers[2],
+                "",
+                math.nan,
+            ]
+        return [
+            self.store,
+            date,
+            file_name,
+            item_code,
+            description,
+            *numbers,
+            "",
+            math.nan,
+        ]
+
+    def sum_row(self, date, file_name, text, amount):
+        """Return the row of a line of the totals, its amount converted to a float."""
+        return [self.store, date, file_name, *self._empty_item, text, to_number(amount)]
+
+
+def find_markers(text, markers):
+    """Return the (line index, position in the line) of each marker found in a text."""
+    found = {}
+    for marker in markers:
+        start = text.find(marker)
+        if start >= 0:
+            line_start = text.rfind("\n", 0, start) + 1
+            found[marker] = (text.count("\n", 0, line_start), start - line_start)
+    return found
+
+
+def lines_between(lines, markers, start_marker, end_marker):
+    """Return the lines strictly between the lines holding two markers."""
+    if start_marker not in markers:
+        return []
+    start = markers[start_marker][0]
+    end = markers[end_marker][0] if end_marker in markers else len(lines) - 1
+    return lines[start + 1 : end]
+
+
+def text_between(lines, markers, start_marker, end_marker):
+    """Return the lines of text going from a marker up to another, both excluded."""
+    if start_marker not in markers:
+        return []
+    start, start_column = markers[start_marker]
+    end, end_column = markers.get(end_marker, (len(lines) - 1, len(lines[-1]) - 1))
+    if end < start or (end == start and end_column < start_column):
+        return []
+    if end == start:
+        return [lines[start][start_column:end_column]]
+    return (
+        [lines[start][start_column:]]
+        + lines[start + 1 : end]
+        + [lines[end][:end_column]]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure how fast an extractor parses a corpus of receipt texts."
+    )
+    parser.add_argument(
+        "store",
+        choices=["canac", "canac_scanned", "home_depot", "home_depot_scanned"],
+        help="extractor whose parse_text() is measured",
+    )
+    parser.add_argument("folder", help="folder holding the receipt texts, as .txt")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="number of passes over the corpus"
+    )
+    args = parser.parse_args()
+
+    from pipeline import list_files
+
+    extractor = importlib.import_module(args.store)
+    texts = []
+    for file_name in list_files(args.folder, ".txt"):
+        with open(os.path.join(args.folder, file_name), encoding="utf-8") as file:
+            texts.append((file.read(), file_name))
+    line_count = sum(text.count("\n") + 1 for text, _ in texts)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text, file_name in texts:
+            extractor.parse_text(text, file_name)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{args.store}: {len(texts)} texts, {line_count} lines, "
+        f"{args.repeat * line_count / elapsed:,.0f} lines/s"
+    )
@@ -0,0 +1,182 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from archive import (
+    MemoryFile,
+    content_digest,
+    file_name,
+    file_size,
+    is_archive,
+    iter_members,
+)
+from metrics import measured, merge_records
+
+# The size from which a PDF is opened to count its pages, and split into page ranges
+# if it has enough of them
+SPLIT_MIN_BYTES = 256 << 10
+
+# The fewest pages of a page range extracted by a worker
+MIN_RANGE_PAGES = 8
+
+# The most page ranges a PDF is split into, per worker: a few, so that the workers
+# finishing first take more of the pages, but not many, as each opens the PDF again
+RANGES_PER_WORKER = 2
+
+
+def list_files(folder_path, extensions):
+    """Return the names of the files in a folder with one of the given extensions, sorted."""
+    return sorted(
+        file_name
+        for file_name in os.listdir(folder_path)
+        if file_name.lower().endswith(extensions)
+    )
+
+
+def input_files(folder_path, extensions):
+    """Return the receipts of a folder, or archive, with one of the given extensions."""
+    if is_archive(folder_path):
+        return iter_members(folder_path, extensions)
+    return [
+        os.path.join(folder_path, name) for name in list_files(folder_path, extensions)
+    ]
+
+
+def extract_item(extract_file, path, pages=None):
+    """Extract a file given as its path, or as a MemoryFile opened with its name."""
+    options = {} if pages is None else {"pages": pages}
+    if isinstance(path, MemoryFile):
+        return extract_file(path.open(), file_name=path.name, **options)
+    return extract_file(path, **options)
+
+
+def page_count(path):
+    """Return the number of pages of a PDF, given as a path or a MemoryFile."""
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(path.data if isinstance(path, MemoryFile) else path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def page_ranges(path, workers, min_pages=MIN_RANGE_PAGES):
+    """Return the page ranges a PDF is extracted in by that many workers."""
+    if workers <= 1 or file_size(path) < SPLIT_MIN_BYTES:
+        return [None]
+    pages = page_count(path)
+    count = min(RANGES_PER_WORKER * workers, pages // min_pages)
+    if count <= 1:
+        return [None]
+    bounds = [pages * i // count for i in range(count + 1)]
+    return list(zip(bounds, bounds[1:], strict=False))
+
+
+def _apply(function, arguments):
+    return function(*arguments)
+
+
+def map_ordered(function, items, workers=1, initializer=None, initargs=()):
+    """Apply a function to every item, yielding the results in the order of the items."""
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield function(item)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def extract_files(
+    extract_file,
+    paths,
+    workers=1,
+    cache=None,
+    initializer=None,
+    initargs=(),
+    metrics=None,
+    split_pages=False,
+):
+    """Yield the rows extracted from each file, in the order of the paths."""
+    extract_part = partial(extract_item, extract_file)
+    if metrics is not None:
+        extract_part = partial(measured, extract_part)
+
+    def extract(paths):
+        # The number of parts of every file given to the workers, in order
+        part_counts = deque()
+
+        def parts():
+            for path in paths:
+                ranges = page_ranges(path, workers) if split_pages else [None]
+                part_counts.append(len(ranges))
+                for pages in ranges:
+                    yield path, pages
+
+        results = map_ordered(
+            partial(_apply, extract_part), parts(), workers, initializer, initargs
+        )
+        for result in results:
+            file_results = [result, *islice(results, part_counts.popleft() - 1)]
+            if metrics is not None:
+                file_results, records = zip(*file_results, strict=True)
+                metrics.add(merge_records(records))
+            if len(file_results) == 1:
+                yield file_results[0]
+            else:
+                yield [row for part_rows in file_results for row in part_rows]
+
+    if cache is None:
+        yield from extract(paths)
+        return
+
+    # The name, size and digest of every file not yielded yet, and whether it is
+    # extracted rather than read back from the cache
+    pending = deque()
+    seen = set()
+
+    def missing():
+        for path in paths:
+            digest = content_digest(path)
+            extracted = digest not in seen and digest not in cache
+            seen.add(digest)
+            pending.append((file_name(path), file_size(path), digest, extracted))
+            if extracted:
+                yield path
+
+    def cached_rows():
+        name, size, digest, _ = pending.popleft()
+        rows = [row[:2] + [name] + row[3:] for row in cache.get(digest)]
+        if metrics is not None:
+            metrics.add(
+                {
+                    "file": name,
+                    "bytes": size,
+                    "stages": {},
+                    "rows": len(rows),
+                    "cached": True,
+                }
+            )
+        return rows
+
+    for rows in extract(missing()):
+        while not pending[0][3]:
+            yield cached_rows()
+        digest = pending.popleft()[2]
+        cache.put(digest, rows)
+        yield rows
+    while pending:
+        yield cached_rows()
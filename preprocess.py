@@ -0,0 +1,146 @@
+import argparse
+import importlib
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from metrics import stage
+
+PREPROCESSINGS = ("pil", "opencv", "opencv-binarized")
+
+# The resolution, in dots per inch, the pages of scanned PDFs are rendered at for OCR
+RASTER_RESOLUTION = 300
+
+# The kernel of PIL's ImageFilter.SMOOTH, which ImageEnhance.Sharpness blends away from.
+SMOOTH_KERNEL = [[1, 1, 1], [1, 5, 1], [1, 1, 1]]
+
+
+def prepare_image(image_path, contrast, sharpness, binarize=False):
+    """Prepare an image for OCR with OpenCV, working on a single grayscale buffer."""
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    if isinstance(image_path, BytesIO):
+        image = cv2.imdecode(
+            np.frombuffer(image_path.getbuffer(), np.uint8), cv2.IMREAD_GRAYSCALE
+        )
+    else:
+        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Cannot decode the image {image_path}")
+
+    image = cv2.medianBlur(image, 3)
+
+    # Stretch the values away from the mean, as ImageEnhance.Contrast does
+    mean = int(image.mean() + 0.5)
+    cv2.addWeighted(image, contrast, image, 0, (1 - contrast) * mean, dst=image)
+
+    # Unsharp mask: stretch the values away from a smoothed copy
+    kernel = np.array(SMOOTH_KERNEL, dtype=np.float32) / 13
+    smoothed = cv2.filter2D(image, -1, kernel)
+    cv2.addWeighted(image, sharpness, smoothed, 1 - sharpness, 0, dst=image)
+    del smoothed
+
+    if binarize:
+        cv2.adaptiveThreshold(
+            image,
+            255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY,
+            31,
+            15,
+            dst=image,
+        )
+
+    return Image.fromarray(image)
+
+
+def receipt_images(path, resolution=RASTER_RESOLUTION, file_name=None):
+    """Yield the images of a scanned receipt, the pages of a PDF rendered one at a time."""
+    if not (file_name or path).lower().endswith(".pdf"):
+        yield path
+        return
+
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        for page in pdf:
+            with stage("rasterize"):
+                image = page.render(scale=resolution / 72, grayscale=True).to_pil()
+                page_file = BytesIO()
+                image.save(page_file, "PNG", compress_level=1)
+                del image
+            page_file.seek(0)
+            yield page_file
+    finally:
+        pdf.close()
+
+
+def _measure(module_name, preprocessing, image_paths):
+    """Prepare the images in a fresh process, returning the time taken and the peak RSS."""
+    module = importlib.import_module(module_name)
+    start = time.perf_counter()
+    for image_path in image_paths:
+        module.prepare_image(image_path, preprocessing)
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the time and memory of the image preprocessings."
+    )
+    parser.add_argument(
+        "folder", nargs="?", help="folder holding the .jpg/.jpeg images"
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="COUNT",
+        help="measure on that many synthetic 12 MP photos instead of a folder",
+    )
+    parser.add_argument(
+        "--store",
+        choices=["canac_scanned", "home_depot_scanned"],
+        default="canac_scanned",
+        help="extractor whose preprocessing settings are used",
+    )
+    args = parser.parse_args()
+
+    import cv2
+    import numpy as np
+
+    from pipeline import list_files
+
+    if args.synthetic:
+        synthetic_folder = tempfile.TemporaryDirectory()
+        args.folder = synthetic_folder.name
+        rng = np.random.default_rng(0)
+        for i in range(args.synthetic):
+            photo = rng.integers(150, 256, (4000, 3000, 3), dtype=np.uint8)
+            for line in range(200, 3800, 60):
+                photo[line : line + 25, 300 : rng.integers(600, 2700)] //= 4
+            cv2.imwrite(os.path.join(args.folder, f"{i:05}.jpg"), photo)
+        del photo
+    elif args.folder is None:
+        parser.error("a folder or --synthetic is required")
+
+    image_paths = [
+        os.path.join(args.folder, file_name)
+        for file_name in list_files(args.folder, (".jpg", ".jpeg"))
+    ]
+    for preprocessing in PREPROCESSINGS:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            elapsed, peak_rss = executor.submit(
+                _measure, args.store, preprocessing, image_paths
+            ).result()
+        print(
+            f"{preprocessing:>16}: "
+            f"{1000 * elapsed / max(len(image_paths), 1):.0f} ms per image, "
+            f"peak RSS {peak_rss:.1f} MiB"
+        )
@@ -0,0 +1,590 @@
+import argparse
+import contextlib
+import importlib
+import os
+from functools import partial
+
+import ocr
+import preprocess
+from cache import DEFAULT_CACHE_SIZE, DEFAULT_TEXT_CACHE_SIZE, cache_paths
+
+# Subcommand: (extractor module, default input folder, default output workbook, help)
+SOURCES = {
+    "canac": (
+        "canac",
+        "receipts/Canac",
+        "receipts/canac_data.xlsx",
+        "convert Canac PDF receipts",
+    ),
+    "canac-scanned": (
+        "canac_scanned",
+        "receipts/Canac",
+        "receipts/canac_data_scanned.xlsx",
+        "convert scanned Canac receipts",
+    ),
+    "home-depot": (
+        "home_depot",
+        "receipts/HomeDepot",
+        "receipts/home-depot_data.xlsx",
+        "convert Home Depot PDF receipts",
+    ),
+    "home-depot-scanned": (
+        "home_depot_scanned",
+        "receipts/HomeDepot",
+        "receipts/homedepot_data_scanned.xlsx",
+        "convert scanned Home Depot receipts",
+    ),
+    "canac-auto": (
+        "canac_auto",
+        "receipts/Canac",
+        "receipts/canac_data_auto.xlsx",
+        "convert Canac receipts, parsing PDFs with text and recognising the others",
+    ),
+    "home-depot-auto": (
+        "home_depot_auto",
+        "receipts/HomeDepot",
+        "receipts/home-depot_data_auto.xlsx",
+        "convert Home Depot receipts, parsing PDFs with text and recognising the others",
+    ),
+    "stores": (
+        "stores",
+        "receipts",
+        "receipts/receipts_data.xlsx",
+        "convert the receipts of every store folder at once into one workbook, with a "
+        "sheet per store",
+    ),
+}
+
+# The sources recognising some or all of their receipts with OCR
+SCANNED_SOURCES = (
+    "canac-scanned",
+    "home-depot-scanned",
+    "canac-auto",
+    "home-depot-auto",
+    "stores",
+)
+
+# The sources each extracting all the receipts of their folder, watched by default
+AUTO_SOURCES = ("canac-auto", "home-depot-auto")
+
+# The source extracting the receipts of all the store folders of its input folder
+STORES_SOURCE = "stores"
+
+# Output format: module writing the rows with its write_rows()
+FORMATS = {"excel": "excel", "parquet": "parquet"}
+
+# How the receipts go through the extraction: one by one in a process pool, or through
+# the stages of async_pipeline
+PIPELINES = ("pool", "async")
+
+# The default of async_pipeline.QUEUE_SIZE, not imported to keep --help fast
+QUEUE_SIZE = 8
+
+
+def add_ocr_arguments(subparser):
+    """Add the options of the OCR of scanned receipts to a subcommand."""
+    subparser.add_argument(
+        "--ocr-backend",
+        choices=ocr.BACKENDS,
+        default="pytesseract",
+        help="run tesseract once per image (pytesseract) or keep it loaded in "
+        "every worker (tesserocr, falls back to pytesseract if not installed)",
+    )
+    subparser.add_argument(
+        "--preprocessing",
+        choices=preprocess.PREPROCESSINGS,
+        default="pil",
+        help="prepare the images with PIL or OpenCV, optionally binarized "
+        "(default: pil)",
+    )
+    subparser.add_argument(
+        "--roi",
+        action="store_true",
+        help="locate the date, items and totals in a low-resolution pass and "
+        "only recognise those regions at full quality",
+    )
+    subparser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="recognise every receipt at half resolution first, and again with more "
+        "costly settings only when the text is not confident or lacks the date or "
+        "total",
+    )
+    subparser.add_argument(
+        "--no-ocr-cache",
+        action="store_true",
+        help="recognise every image again instead of reusing the texts of previous "
+        "runs with the same settings",
+    )
+    subparser.add_argument(
+        "--ocr-cache-size",
+        type=int,
+        default=DEFAULT_TEXT_CACHE_SIZE >> 20,
+        metavar="MIB",
+        help="size of the OCR texts kept, the least recently used dropped first "
+        f"(default: {DEFAULT_TEXT_CACHE_SIZE >> 20} MiB)",
+    )
+
+
+def ocr_cache(args, output_path):
+    """Return the OCR cache given to the scanned extractors, as its (path, size)."""
+    if args.no_ocr_cache:
+        return None
+    return cache_paths(output_path)[1], args.ocr_cache_size << 20
+
+
+def cache_name(module_name, options):
+    """Return the name the rows of an extractor are cached under, with its OCR settings."""
+    if not options:
+        return module_name
+    return (
+        f"{module_name}:{options['ocr_backend']}:{options['preprocessing']}"
+        f":roi={options['roi']}:adaptive={options['adaptive']}"
+    )
+
+
+def build_parser():
+    """Build the parser of the command line, with one subcommand per receipt source."""
+    parser = argparse.ArgumentParser(
+        prog="receipts", description="Convert receipts into an Excel spreadsheet."
+    )
+    subparsers = parser.add_subparsers(dest="source", required=True)
+    for source, (_, input_folder, output_path, description) in SOURCES.items():
+        subparser = subparsers.add_parser(source, help=description)
+        subparser.add_argument(
+            "--input",
+            default=input_folder,
+            help="folder, or zip or tar archive, holding the "
+            + ("store folders" if source == STORES_SOURCE else "receipts")
+            + f" (default: {input_folder})",
+        )
+        subparser.add_argument(
+            "--output",
+            help=f"Excel workbook, or Parquet dataset folder, to write (default: "
+            f"{output_path}, or the same without .xlsx for Parquet)",
+        )
+        subparser.add_argument(
+            "--format",
+            choices=FORMATS,
+            default="excel",
+            help="write an Excel workbook, or typed Parquet files partitioned by year "
+            "and month of the receipts (default: excel)",
+        )
+        subparser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="number of processes used to extract the receipts (default: 1)",
+        )
+        subparser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="parse every receipt again instead of reusing the rows of previous runs",
+        )
+        subparser.add_argument(
+            "--cache-size",
+            type=int,
+            default=DEFAULT_CACHE_SIZE >> 20,
+            metavar="MIB",
+            help="size of the rows kept, the least recently used dropped first "
+            f"(default: {DEFAULT_CACHE_SIZE >> 20} MiB)",
+        )
+        subparser.add_argument(
+            "--metrics",
+            nargs="?",
+            const="",
+            metavar="FILE",
+            help="time every stage of the extraction and print a summary, also "
+            "writing the records of every file to FILE as JSON lines if given",
+        )
+        subparser.add_argument(
+            "--slowest",
+            type=int,
+            default=5,
+            help="number of slowest files listed in the metrics summary (default: 5)",
+        )
+        subparser.add_argument(
+            "--reconcile",
+            action="store_true",
+            help="check that the items, taxes and total of every receipt add up, "
+            "adding the missing sum lines and Items Sum, Status and Inferred columns",
+        )
+        subparser.add_argument(
+            "--append",
+            action="store_true",
+            help="add the receipts not in the workbook yet to it, and replace the rows "
+            "of those changed since it was written, keeping everything else",
+        )
+        subparser.add_argument(
+            "--skip-duplicates",
+            action="store_true",
+            help="skip the receipts with the same content, a similar image or the "
+            "same store, date, total and items as an earlier one, and list them",
+        )
+        if source not in (*AUTO_SOURCES, STORES_SOURCE):
+            subparser.add_argument(
+                "--pipeline",
+                choices=PIPELINES,
+                default="pool",
+                help="extract the receipts one by one in a process pool, or overlap "
+                "reading, decoding, OCR and writing in an asyncio pipeline, running "
+                "tesseract directly without the OCR cache (default: pool)",
+            )
+            subparser.add_argument(
+                "--queue-size",
+                type=int,
+                default=QUEUE_SIZE,
+                help="receipts waiting at most in front of every stage of the asyncio "
+                f"pipeline (default: {QUEUE_SIZE})",
+            )
+        if source in SCANNED_SOURCES:
+            add_ocr_arguments(subparser)
+
+    subparser = subparsers.add_parser(
+        "watch",
+        help="keep the workbooks up to date with the receipts dropped in the folders",
+    )
+    subparser.add_argument(
+        "--sources",
+        nargs="+",
+        choices=[source for source in SOURCES if source != STORES_SOURCE],
+        default=list(AUTO_SOURCES),
+        help="sources to watch, each in its default input folder and output workbook "
+        f"(default: {' '.join(AUTO_SOURCES)})",
+    )
+    subparser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to extract the receipts (default: 1)",
+    )
+    subparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every receipt again instead of reusing the rows of previous runs",
+    )
+    subparser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE >> 20,
+        metavar="MIB",
+        help="size of the rows kept, the least recently used dropped first "
+        f"(default: {DEFAULT_CACHE_SIZE >> 20} MiB)",
+    )
+    subparser.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="seconds a receipt must stay unmodified before it is extracted "
+        "(default: 2)",
+    )
+    subparser.add_argument(
+        "--polling",
+        action="store_true",
+        help="list the folders at a fixed interval instead of using inotify",
+    )
+    subparser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=5.0,
+        help="seconds between two listings of the folders when polling (default: 5)",
+    )
+    add_ocr_arguments(subparser)
+    return parser
+
+
+def reconciled(rows, columns, metrics=None):
+    """Reconcile all the rows of a batch at once, returning the new rows and columns."""
+    from reconcile import reconcile
+    from table import RowTable
+
+    table = RowTable(columns)
+    table.extend(rows)
+    with metrics.stage("reconcile") if metrics else contextlib.nullcontext():
+        frame = reconcile(table.to_frame())
+    return frame.itertuples(index=False, name=None), list(frame.columns)
+
+
+def unwritten(paths, written, written_at, store_of=None):
+    """Return the receipts to add to a workbook, and the receipts they replace in it."""
+    from archive import file_name
+
+    # The receipts written, by the key of the receipts replacing them
+    names = {}
+    for store, name in written:
+        names.setdefault(name if store_of is None else (store, name), []).append(
+            (store, name)
+        )
+
+    def key(path):
+        name = file_name(path)
+        if store_of is None:
+            return name
+        return store_of(path if isinstance(path, str) else name), name
+
+    # The receipts of an archive, read lazily, are only added when their name is new
+    if not isinstance(paths, list):
+        return (path for path in paths if key(path) not in names), set()
+    added = []
+    replaced = set()
+    for path in paths:
+        written_keys = names.get(key(path))
+        if written_keys is None:
+            added.append(path)
+        elif os.path.getmtime(path) > written_at:
+            added.append(path)
+            replaced.update(written_keys)
+    return added, replaced
+
+
+def digested(paths, digests, store_of=None):
+    """Yield the receipts of paths, recording the digest of the content of each."""
+    from archive import content_digest, file_name
+
+    for path in paths:
+        name = file_name(path)
+        key = name if store_of is None else (store_of(path), name)
+        digests[key] = content_digest(path)
+        yield path
+
+
+def run(args):
+    """Extract the receipts of a source and stream their rows into a workbook."""
+    from cache import open_cache
+
+    write_rows = importlib.import_module(FORMATS[args.format]).write_rows
+    module_name, _, output_path, _ = SOURCES[args.source]
+    if args.output is None:
+        args.output = output_path
+        if args.format == "parquet":
+            args.output = output_path.removesuffix(".xlsx")
+    extractor = importlib.import_module(module_name)
+    if args.source == STORES_SOURCE and args.format == "excel":
+        from excel import write_sheets
+
+        write_rows = partial(
+            write_sheets,
+            combined_sheet=extractor.COMBINED_SHEET,
+            sheets=list(extractor.STORES),
+        )
+    options = {}
+    if args.source in SCANNED_SOURCES:
+        options = {
+            "ocr_backend": args.ocr_backend,
+            "preprocessing": args.preprocessing,
+            "roi": args.roi,
+            "ocr_cache": ocr_cache(args, args.output),
+            "adaptive": args.adaptive,
+        }
+    appending = args.append and os.path.exists(args.output)
+    if appending:
+        from excel import ExistingWorkbook, upsert_rows
+
+        combined_sheet = None
+        if args.source == STORES_SOURCE:
+            combined_sheet = extractor.COMBINED_SHEET
+        written = ExistingWorkbook(args.output).receipts(combined_sheet)
+        written_at = os.path.getmtime(args.output)
+    metrics = None
+    if args.metrics is not None:
+        from metrics import Metrics
+
+        metrics = Metrics(args.metrics or None, args.slowest)
+    # The digests of the receipts extracted, written along their rows to Parquet
+    digests = None
+    if args.format == "parquet":
+        digests = {}
+        if args.source == STORES_SOURCE:
+            write_rows = partial(
+                write_rows, digest_of=lambda row: digests.get((row[0], row[2]))
+            )
+        else:
+            write_rows = partial(write_rows, digest_of=lambda row: digests.get(row[2]))
+
+    def write(rows):
+        columns = extractor.COLUMNS
+        if metrics is not None:
+            rows = metrics.timed(rows, "extract")
+        if args.reconcile:
+            rows, columns = reconciled(rows, columns, metrics)
+        if metrics is None:
+            return write_rows(args.output, columns, rows)
+        extracting = metrics.stages.get("extract", 0.0)
+        with metrics.stage("write"):
+            count = write_rows(args.output, columns, rows)
+        metrics.stages["write"] -= metrics.stages["extract"] - extracting
+        return count
+
+    with open_cache(
+        cache_name(module_name, options),
+        extractor.PARSER_VERSION,
+        enabled=not args.no_cache,
+        path=cache_paths(args.output)[0],
+        max_bytes=args.cache_size << 20,
+    ) as cache:
+        if getattr(args, "pipeline", "pool") == "async":
+            import async_pipeline
+
+            count, queues = async_pipeline.write_extracted(
+                write,
+                module_name,
+                args.input,
+                args.workers,
+                cache,
+                scanned=args.source in SCANNED_SOURCES,
+                preprocessing=options.get("preprocessing", "pil"),
+                metrics=metrics,
+                queue_size=args.queue_size,
+                digests=digests,
+            )
+        elif args.skip_duplicates or appending or digests is not None:
+            from pipeline import input_files
+
+            queues = None
+            if args.source == STORES_SOURCE:
+                paths = extractor.folder_paths(args.input)
+            else:
+                paths = input_files(args.input, extractor.EXTENSIONS)
+            if appending:
+                paths, replaced = unwritten(
+                    paths,
+                    written,
+                    written_at,
+                    extractor.store_of if args.source == STORES_SOURCE else None,
+                )
+                write_rows = partial(
+                    upsert_rows,
+                    replaced=replaced,
+                    combined_sheet=combined_sheet,
+                    sheets=list(extractor.STORES) if combined_sheet else (),
+                )
+            if digests is not None:
+                paths = digested(
+                    paths,
+                    digests,
+                    extractor.store_of if args.source == STORES_SOURCE else None,
+                )
+            extract_options = {
+                "workers": args.workers,
+                "cache": cache,
+                "metrics": metrics,
+                **options,
+            }
+            if args.skip_duplicates:
+                from duplicates import KEY_COLUMNS, DuplicateIndex, skip_duplicates
+
+                index = DuplicateIndex()
+                if appending:
+                    # The receipts of the workbook are the originals of their copies
+                    written_rows = ExistingWorkbook(args.output).receipt_rows(
+                        KEY_COLUMNS, combined_sheet
+                    )
+                    for (store, name), rows in written_rows.items():
+                        if (store, name) not in replaced:
+                            index.add_written(name, rows)
+                extracted = skip_duplicates(
+                    extractor.extract_paths, paths, index, **extract_options
+                )
+            else:
+                extracted = extractor.extract_paths(paths, **extract_options)
+            count = write(row for rows in extracted for row in rows)
+        else:
+            queues = None
+            count = write(
+                extractor.iter_rows(
+                    args.input,
+                    workers=args.workers,
+                    cache=cache,
+                    metrics=metrics,
+                    **options,
+                )
+            )
+    if appending:
+        print(f"Tabulated data ({count} rows) has been added to '{args.output}'")
+    else:
+        print(f"Tabulated data ({count} rows) has been saved to '{args.output}'")
+    if args.skip_duplicates:
+        from duplicates import print_duplicates
+
+        print_duplicates(index)
+    if queues is not None:
+        async_pipeline.print_stats(queues)
+    if metrics is not None:
+        metrics.report()
+
+
+def run_watch(args):
+    """Watch the input folders of the sources and keep their workbooks up to date."""
+    from cache import open_cache
+    from watch import Output, watch
+
+    with contextlib.ExitStack() as stack:
+        outputs = []
+        for source in args.sources:
+            module_name, input_folder, output_path, _ = SOURCES[source]
+            if not os.path.isdir(input_folder):
+                print(f"Skipping {source}: there is no folder '{input_folder}'")
+                continue
+            extractor = importlib.import_module(module_name)
+            options = {}
+            if source in SCANNED_SOURCES:
+                options = {
+                    "ocr_backend": args.ocr_backend,
+                    "preprocessing": args.preprocessing,
+                    "roi": args.roi,
+                    "ocr_cache": ocr_cache(args, output_path),
+                    "adaptive": args.adaptive,
+                }
+            cache = stack.enter_context(
+                open_cache(
+                    cache_name(module_name, options),
+                    extractor.PARSER_VERSION,
+                    enabled=not args.no_cache,
+                    path=cache_paths(output_path)[0],
+                    max_bytes=args.cache_size << 20,
+                )
+            )
+            outputs.append(Output(extractor, input_folder, output_path, options, cache))
+        if not outputs:
+            return
+        try:
+            watch(outputs, args.workers, args.settle, args.poll_interval, args.polling)
+        except KeyboardInterrupt:
+            print("Stopped watching")
+
+
+def main(argv=None):
+    """Run the command line with the given arguments, or those of the process."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "pipeline", "pool") == "async" and (
+        getattr(args, "roi", False) or getattr(args, "adaptive", False)
+    ):
+        parser.error("--roi and --adaptive are not supported by the asyncio pipeline")
+    if getattr(args, "pipeline", "pool") == "async" and getattr(
+        args, "skip_duplicates", False
+    ):
+        parser.error("--skip-duplicates is not supported by the asyncio pipeline")
+    if getattr(args, "pipeline", "pool") == "async" and (
+        getattr(args, "ocr_backend", "pytesseract") != "pytesseract"
+        or getattr(args, "no_ocr_cache", False)
+        or getattr(args, "ocr_cache_size", DEFAULT_TEXT_CACHE_SIZE >> 20)
+        != DEFAULT_TEXT_CACHE_SIZE >> 20
+    ):
+        parser.error(
+            "--ocr-backend tesserocr, --no-ocr-cache and --ocr-cache-size are not "
+            "supported by the asyncio pipeline, which runs tesseract directly without "
+            "the OCR cache"
+        )
+    if getattr(args, "append", False) and (
+        args.format != "excel" or getattr(args, "pipeline", "pool") == "async"
+    ):
+        parser.error("--append only adds to Excel workbooks, with the pool pipeline")
+    if args.source == "watch":
+        run_watch(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
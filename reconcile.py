@@ -0,0 +1,181 @@
+import argparse
+import time
+
+# Quebec sales taxes, applied to the subtotal
+TPS_PERCENTAGE = 0.05
+TVQ_PERCENTAGE = 0.09975
+
+# The largest difference, in dollars, between two amounts that should be equal
+TOLERANCE = 0.05
+
+# The kind of amount of every sum line, by the way the extractors label it
+SUM_KINDS = {
+    "SOUS-TOTAL": "subtotal",
+    "SOUS TOTAL": "subtotal",
+    "TPS": "tps",
+    "TPS/TVH": "tps",
+    "TVQ": "tvq",
+    "TVP/TVQ": "tvq",
+    "TOTAL": "total",
+}
+KINDS = ("subtotal", "tps", "tvq", "total")
+
+# The label of the sum lines added when a receipt lacks one, unless the batch has one
+DEFAULT_LABELS = {
+    "subtotal": "SOUS TOTAL",
+    "tps": "TPS",
+    "tvq": "TVQ",
+    "total": "TOTAL",
+}
+
+# The columns added to the rows
+ITEMS_SUM_COLUMN = "Items Sum"
+STATUS_COLUMN = "Status"
+INFERRED_COLUMN = "Inferred"
+
+
+def reconcile(frame, tolerance=TOLERANCE):
+    """Check that the items, taxes and total of every receipt of a batch add up."""
+    import numpy as np
+    import pandas as pd
+
+    # Number the receipts, by store and file, in the order they first appear, and the
+    # kinds of amounts
+    store_codes, stores = pd.factorize(frame[frame.columns[0]], sort=False)
+    file_codes = pd.factorize(frame[frame.columns[2]], sort=False)[0]
+    codes, files = pd.factorize(file_codes * len(stores) + store_codes, sort=False)
+    receipt_count = len(files)
+    kinds = frame["TextSum"].map(SUM_KINDS)
+    kind_codes = kinds.map({kind: code for code, kind in enumerate(KINDS)})
+    kind_codes = kind_codes.fillna(-1).to_numpy(dtype=np.int64)
+    is_sum = kind_codes >= 0
+    amounts = pd.to_numeric(frame["Sum"], errors="coerce").to_numpy(float, copy=True)
+    item_totals = pd.to_numeric(frame["Total"], errors="coerce").to_numpy(
+        float, copy=True
+    )
+    item_totals[frame["TextSum"].fillna("").ne("").to_numpy()] = np.nan
+
+    has_items = ~np.isnan(item_totals)
+    items = np.bincount(
+        codes[has_items], weights=item_totals[has_items], minlength=receipt_count
+    ).astype(float)
+    items[np.bincount(codes[has_items], minlength=receipt_count) == 0] = np.nan
+
+    # The first amount of every kind parsed on every receipt, as a receipts x kinds array
+    keys = codes * len(KINDS) + kind_codes
+    parsed = np.full((receipt_count, len(KINDS)), np.nan)
+    with_amount = is_sum & ~np.isnan(amounts)
+    found, first = np.unique(keys[with_amount], return_index=True)
+    parsed.flat[found] = amounts[with_amount][first]
+    present = np.zeros((receipt_count, len(KINDS)), dtype=bool)
+    present.flat[keys[is_sum]] = True
+
+    def fill(values, default):
+        return np.where(np.isnan(values), default, values)
+
+    rate = 1 + TPS_PERCENTAGE + TVQ_PERCENTAGE
+    subtotal, tps, tvq, total = parsed.T
+    subtotal = fill(subtotal, total / rate)
+    subtotal = np.round(fill(fill(subtotal, total - tps - tvq), items), 2)
+    tps = fill(tps, np.round(subtotal * TPS_PERCENTAGE, 2))
+    tvq = fill(tvq, np.round(subtotal * TVQ_PERCENTAGE, 2))
+    total = fill(total, np.round(subtotal + tps + tvq, 2))
+    inferred = np.column_stack([subtotal, tps, tvq, total])
+
+    with np.errstate(invalid="ignore"):
+        failures = {
+            "items": np.abs(items - subtotal) > tolerance,
+            "taxes": (np.abs(tps - subtotal * TPS_PERCENTAGE) > tolerance)
+            | (np.abs(tvq - subtotal * TVQ_PERCENTAGE) > tolerance),
+            "total": np.abs(subtotal + tps + tvq - total) > tolerance,
+        }
+    status = np.full(receipt_count, "", dtype=object)
+    for name, failed in failures.items():
+        status[failed] = status[failed] + ", " + name
+    status = np.array([failed[2:] or "ok" for failed in status], dtype=object)
+    status[np.isnan(subtotal)] = "incomplete"
+
+    # Fill in the sum lines parsed without an amount
+    result = frame.copy()
+    line_inferred = is_sum & np.isnan(amounts)
+    amounts[line_inferred] = inferred.flat[keys[line_inferred]]
+    result["Sum"] = amounts
+    result[INFERRED_COLUMN] = line_inferred & ~np.isnan(amounts)
+
+    # Add the sum lines missing altogether, after the last row of their receipt
+    added_receipts, added_kinds = np.nonzero(~present & ~np.isnan(inferred))
+    labels = {**DEFAULT_LABELS, **frame["TextSum"].groupby(kinds).first().to_dict()}
+    first_rows = np.unique(codes, return_index=True)[1][added_receipts]
+    added_rows = pd.DataFrame(
+        {
+            column: np.nan if pd.api.types.is_numeric_dtype(dtype) else ""
+            for column, dtype in frame.dtypes.items()
+        },
+        index=range(len(added_receipts)),
+    )
+    for column in frame.columns[:3]:
+        added_rows[column] = frame[column].to_numpy()[first_rows]
+    added_rows["TextSum"] = [labels[KINDS[kind]] for kind in added_kinds]
+    added_rows["Sum"] = inferred[added_receipts, added_kinds]
+    added_rows[INFERRED_COLUMN] = True
+
+    result = pd.concat([result, added_rows], ignore_index=True)
+    row_codes = np.concatenate([codes, added_receipts])
+    order = np.argsort(row_codes, kind="stable")
+    result = result.iloc[order].reset_index(drop=True)
+    result[ITEMS_SUM_COLUMN] = items[row_codes[order]]
+    result[STATUS_COLUMN] = status[row_codes[order]]
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure how fast a batch of synthetic receipts is reconciled."
+    )
+    parser.add_argument(
+        "--receipts",
+        type=int,
+        default=20_000,
+        help="number of receipts, of 20 items and 4 sum lines each (default: 20000)",
+    )
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from canac import COLUMNS
+
+    rows = []
+    for receipt in range(args.receipts):
+        file_name = f"{receipt}.pdf"
+        subtotal = 0.0
+        for item in range(20):
+            total = round(1 + (receipt * 7 + item * 13) % 500 / 10, 2)
+            subtotal += total
+            rows.append(
+                ["Canac", "2023-09-01", file_name, str(item), "Article", 1.0, "UN"]
+                + [total, total, "", float("nan")]
+            )
+        subtotal = round(subtotal, 2)
+        tps = round(subtotal * TPS_PERCENTAGE, 2)
+        tvq = round(subtotal * TVQ_PERCENTAGE, 2)
+        sums = {"SOUS-TOTAL": subtotal, "TPS/TVH": tps, "TVP/TVQ": tvq}
+        sums["TOTAL"] = round(subtotal + tps + tvq, 2)
+        # Every tenth receipt lacks its taxes, every hundredth has a wrong total
+        if receipt % 10 == 0:
+            del sums["TPS/TVH"], sums["TVP/TVQ"]
+        if receipt % 100 == 1:
+            sums["TOTAL"] += 1
+        for label, amount in sums.items():
+            rows.append(["Canac", "2023-09-01", file_name, "", "", float("nan"), ""])
+            rows[-1] += [float("nan"), float("nan"), label, amount]
+    frame = pd.DataFrame(rows, columns=COLUMNS)
+
+    start = time.perf_counter()
+    result = reconcile(frame)
+    elapsed = time.perf_counter() - start
+    statuses = result.groupby("Filename")["Status"].first().value_counts()
+    print(
+        f"{args.receipts} receipts, {len(frame)} rows reconciled in {elapsed:.3f} s "
+        f"({int(result['Inferred'].sum())} sum lines inferred): "
+        + ", ".join(f"{count} {status}" for status, count in statuses.items())
+    )
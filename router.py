@@ -0,0 +1,151 @@
+import importlib
+from functools import partial
+
+import ocr
+from pipeline import extract_files, input_files
+
+# The number of characters a PDF must hold for its text layer to be parsed, rather
+# than its pages rendered and recognised with OCR
+MIN_TEXT_CHARS = 20
+
+# The files routed, by extension: PDFs, with or without a text layer, and images
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+EXTENSIONS = (".pdf", *IMAGE_EXTENSIONS)
+
+# The columns of the scanned extractors holding what a PDF extractor names otherwise
+COLUMN_ALIASES = {
+    "Filename": "File Name",
+    "Article": "Item Code",
+    "Quantité": "Quantity",
+    "Prix Unité": "Unit Price",
+}
+# The same, both ways
+_ALIASES = {**COLUMN_ALIASES, **{name: alias for alias, name in COLUMN_ALIASES.items()}}
+
+
+def has_text_layer(pdf_path, min_chars=MIN_TEXT_CHARS):
+    """Return whether a PDF holds some text, checking its pages until enough is found."""
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        chars = 0
+        for page in pdf:
+            chars += page.get_textpage().count_chars()
+            if chars >= min_chars:
+                return True
+        return False
+    finally:
+        pdf.close()
+
+
+def route(path, file_name=None):
+    """Return how a receipt is extracted: "text" from its text layer, or "ocr"."""
+    if (file_name or path).lower().endswith(".pdf") and has_text_layer(path):
+        return "text"
+    return "ocr"
+
+
+def convert_rows(rows, from_columns, to_columns):
+    """Return rows reordered from some columns to others, matched by name or alias."""
+    indexes = []
+    for column in to_columns:
+        name = column if column in from_columns else _ALIASES.get(column)
+        indexes.append(from_columns.index(name) if name in from_columns else None)
+    return [
+        [row[index] if index is not None else "" for index in indexes] for row in rows
+    ]
+
+
+def extract_file(
+    text_module,
+    scanned_module,
+    path,
+    preprocessing="pil",
+    roi=False,
+    adaptive=False,
+    file_name=None,
+):
+    """Extract the rows of one receipt with the cheapest extractor able to read it."""
+    text_extractor = importlib.import_module(text_module)
+    kind = route(path, file_name)
+    if file_name is not None:
+        # Read the file object again from its start
+        path.seek(0)
+    if kind == "text":
+        return text_extractor.extract_file(path, file_name)
+    scanned_extractor = importlib.import_module(scanned_module)
+    rows = scanned_extractor.extract_file(path, preprocessing, roi, adaptive, file_name)
+    return convert_rows(rows, scanned_extractor.COLUMNS, text_extractor.COLUMNS)
+
+
+def parser_version(text_extractor, scanned_extractor):
+    """Return the version of the rows of two extractors routed together."""
+    return text_extractor.PARSER_VERSION * 1000 + scanned_extractor.PARSER_VERSION
+
+
+def extract_paths(
+    text_module,
+    scanned_module,
+    paths,
+    workers=1,
+    cache=None,
+    ocr_backend="pytesseract",
+    preprocessing="pil",
+    roi=False,
+    metrics=None,
+    ocr_cache=None,
+    adaptive=False,
+):
+    """Yield the rows extracted from each receipt by the cheapest extractor, in order."""
+    return extract_files(
+        partial(
+            extract_file,
+            text_module,
+            scanned_module,
+            preprocessing=preprocessing,
+            roi=roi,
+            adaptive=adaptive,
+        ),
+        paths,
+        workers,
+        cache,
+        initializer=ocr.init_worker,
+        initargs=(ocr_backend, ocr.worker_threads(workers), ocr_cache),
+        metrics=metrics,
+    )
+
+
+def iter_rows(
+    text_module,
+    scanned_module,
+    folder_path,
+    workers=1,
+    cache=None,
+    ocr_backend="pytesseract",
+    preprocessing="pil",
+    roi=False,
+    metrics=None,
+    ocr_cache=None,
+    adaptive=False,
+):
+    """Yield the rows extracted from the receipts in a folder, PDFs or images."""
+    for rows in extract_paths(
+        text_module,
+        scanned_module,
+        folder_paths(folder_path),
+        workers,
+        cache,
+        ocr_backend,
+        preprocessing,
+        roi,
+        metrics,
+        ocr_cache,
+        adaptive,
+    ):
+        yield from rows
+
+
+def folder_paths(folder):
+    """Return the receipts of a folder, or archive, that can be routed, see input_files()."""
+    return input_files(folder, EXTENSIONS)
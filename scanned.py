@@ -0,0 +1,222 @@
+import importlib
+import os
+from functools import partial
+
+from PIL import Image, ImageEnhance, ImageFilter
+
+import ocr
+import preprocess
+from metrics import stage
+from parsing import Row, has_date_and_total
+from pipeline import extract_files, input_files
+from table import RowTable
+
+
+def receipt_rows(rows):
+    """Return the rows parsed from a receipt as Row, once its images are released."""
+    return [Row(row) for row in rows]
+
+
+def correct_image_orientation(image_path, mode=None):
+    """Correct the orientation of an image based on its EXIF data."""
+    image = Image.open(image_path)
+    if mode:
+        image.draft(mode, image.size)
+    try:
+        exif_data = image._getexif()
+        orientation = exif_data.get(274)
+        if orientation == 3:
+            image = image.rotate(180, expand=True)
+        elif orientation == 6:
+            image = image.rotate(-90, expand=True)
+        elif orientation == 8:
+            image = image.rotate(90, expand=True)
+    except (AttributeError, KeyError, IndexError):
+        pass
+    return image
+
+
+def prepare_image_for_ocr(image_path, contrast, sharpness):
+    """Prepare an image for OCR by converting it to grayscale and enhancing contrast."""
+    image = correct_image_orientation(image_path, "L")
+    image = image.convert("L")
+    image = image.filter(ImageFilter.MedianFilter(size=3))
+    enhancer = ImageEnhance.Contrast(image)
+    image = enhancer.enhance(contrast)
+    enhancer = ImageEnhance.Sharpness(image)
+    image = enhancer.enhance(sharpness)
+    return image
+
+
+def prepare_image(store_module, image_path, preprocessing="pil"):
+    """Prepare an image for OCR with the PIL chain or its OpenCV equivalent."""
+    store = importlib.import_module(store_module)
+    if preprocessing == "pil":
+        return prepare_image_for_ocr(image_path, store.CONTRAST, store.SHARPNESS)
+    return preprocess.prepare_image(
+        image_path,
+        store.CONTRAST,
+        store.SHARPNESS,
+        binarize=preprocessing == "opencv-binarized",
+    )
+
+
+def recognize(
+    store_module,
+    image_files,
+    preprocessing="pil",
+    roi=False,
+    psm=None,
+    reduction=1,
+    confidence=False,
+):
+    """Return the text of the images of a receipt and the mean confidence of its words."""
+    store = importlib.import_module(store_module)
+    results = [
+        ocr.recognize_file(
+            image_file,
+            partial(prepare_image, store_module, preprocessing=preprocessing),
+            (store_module, preprocessing, store.CONTRAST, store.SHARPNESS),
+            store.find_text_regions if roi else None,
+            psm,
+            reduction,
+            confidence,
+        )
+        for image_file in image_files
+    ]
+    text = "\n".join(text for text, _ in results)
+    confidences = [confidence for _, confidence in results]
+    if not confidences or None in confidences:
+        return text, None
+    return text, sum(confidences) / len(confidences)
+
+
+def extract_file(
+    store_module,
+    image_path,
+    preprocessing="pil",
+    roi=False,
+    adaptive=False,
+    file_name=None,
+):
+    """Extract the rows of one scanned receipt with the OCR engine of this process."""
+    store = importlib.import_module(store_module)
+    file_name = file_name or os.path.basename(image_path)
+
+    if adaptive:
+        image_files = list(preprocess.receipt_images(image_path, file_name=file_name))
+        rows = ocr.escalate(
+            [
+                partial(
+                    recognize,
+                    store_module,
+                    image_files,
+                    attempt_preprocessing or preprocessing,
+                    roi,
+                    psm,
+                    reduction,
+                    confidence=True,
+                )
+                for attempt_preprocessing, reduction, psm in store.ADAPTIVE_ATTEMPTS
+            ],
+            partial(store.parse_text, file_name=file_name),
+            has_date_and_total,
+        )
+        return receipt_rows(rows)
+
+    text, _ = recognize(
+        store_module,
+        preprocess.receipt_images(image_path, file_name=file_name),
+        preprocessing,
+        roi,
+        store.PSM,
+    )
+
+    with stage("parse"):
+        return receipt_rows(store.parse_text(text, file_name))
+
+
+def extract_paths(
+    store_module,
+    image_paths,
+    workers=1,
+    cache=None,
+    ocr_backend="pytesseract",
+    preprocessing="pil",
+    roi=False,
+    metrics=None,
+    ocr_cache=None,
+    adaptive=False,
+):
+    """Yield the rows extracted from each scanned receipt using tesseract, in order."""
+    return extract_files(
+        partial(
+            extract_file,
+            store_module,
+            preprocessing=preprocessing,
+            roi=roi,
+            adaptive=adaptive,
+        ),
+        image_paths,
+        workers,
+        cache,
+        initializer=ocr.init_worker,
+        initargs=(ocr_backend, ocr.worker_threads(workers), ocr_cache),
+        metrics=metrics,
+    )
+
+
+def iter_rows(
+    store_module,
+    file_folder_path,
+    workers=1,
+    cache=None,
+    ocr_backend="pytesseract",
+    preprocessing="pil",
+    roi=False,
+    metrics=None,
+    ocr_cache=None,
+    adaptive=False,
+):
+    """Yield the rows extracted from the scanned receipts in a folder using tesseract."""
+    store = importlib.import_module(store_module)
+    image_paths = input_files(file_folder_path, store.EXTENSIONS)
+    for rows in extract_paths(
+        store_module,
+        image_paths,
+        workers,
+        cache,
+        ocr_backend,
+        preprocessing,
+        roi,
+        metrics,
+        ocr_cache,
+        adaptive,
+    ):
+        yield from rows
+
+
+def extract_expenses(
+    store_module,
+    file_folder_path,
+    workers=1,
+    cache=None,
+    ocr_backend="pytesseract",
+    preprocessing="pil",
+    roi=False,
+):
+    """Extract tables from scanned receipts in a folder using tesseract."""
+    store = importlib.import_module(store_module)
+    data_table = RowTable(store.COLUMNS)
+    data_table.extend(
+        iter_rows(
+            store_module,
+            file_folder_path,
+            workers,
+            cache,
+            ocr_backend,
+            preprocessing,
+            roi,
+        )
+    )
+    return data_table.to_frame()
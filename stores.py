@@ -0,0 +1,148 @@
+import importlib
+import os
+from functools import partial
+
+import ocr
+import router
+from archive import is_archive, iter_members
+from pipeline import extract_files, input_files
+
+# Store: (its folder in the receipts folder, PDF extractor, scanned extractor)
+STORES = {
+    "Canac": ("Canac", "canac", "canac_scanned"),
+    "Home Depot": ("HomeDepot", "home_depot", "home_depot_scanned"),
+}
+
+# The columns the rows of every store are given, whatever their extractor names them
+COLUMNS = [
+    "Store",
+    "Date",
+    "File Name",
+    "Item Code",
+    "Description",
+    "Quantity",
+    "UdM",
+    "Unit Price",
+    "Total",
+    "TextSum",
+    "Sum",
+]
+
+# The files extracted, by extension
+EXTENSIONS = router.EXTENSIONS
+
+# The sheet holding the rows of all the stores, before the sheet of every store
+COMBINED_SHEET = "All"
+
+
+def _parser_version():
+    version = 0
+    for _, text_module, scanned_module in STORES.values():
+        version = version * 1_000_000 + router.parser_version(
+            importlib.import_module(text_module),
+            importlib.import_module(scanned_module),
+        )
+    return version
+
+
+PARSER_VERSION = _parser_version()
+
+
+def store_of(path):
+    """Return the store of a receipt, from the name of its folder, or None."""
+    folder = os.path.basename(os.path.dirname(path))
+    for store, (store_folder, _, _) in STORES.items():
+        if store_folder == folder:
+            return store
+    return None
+
+
+def store_folders(folder):
+    """Return the folders of the stores found in a folder, by store."""
+    return {
+        store: os.path.join(folder, store_folder)
+        for store, (store_folder, _, _) in STORES.items()
+        if os.path.isdir(os.path.join(folder, store_folder))
+    }
+
+
+def folder_paths(folder):
+    """Return the receipts of every store folder found in a folder, store by store."""
+    if is_archive(folder):
+        return (
+            member
+            for member in iter_members(folder, EXTENSIONS)
+            if store_of(member.name) is not None
+        )
+    return [
+        path
+        for store_folder in store_folders(folder).values()
+        for path in input_files(store_folder, EXTENSIONS)
+    ]
+
+
+def extract_file(path, preprocessing="pil", roi=False, adaptive=False, file_name=None):
+    """Extract the rows of a receipt of any store, with the columns of COLUMNS."""
+    _, text_module, scanned_module = STORES[store_of(file_name or path)]
+    rows = router.extract_file(
+        text_module, scanned_module, path, preprocessing, roi, adaptive, file_name
+    )
+    text_columns = importlib.import_module(text_module).COLUMNS
+    return router.convert_rows(rows, text_columns, COLUMNS)
+
+
+def extract_paths(
+    paths,
+    workers=1,
+    cache=None,
+    ocr_backend="pytesseract",
+    preprocessing="pil",
+    roi=False,
+    metrics=None,
+    ocr_cache=None,
+    adaptive=False,
+):
+    """Yield the rows extracted from each receipt of any store, in the order of the paths."""
+    return extract_files(
+        partial(extract_file, preprocessing=preprocessing, roi=roi, adaptive=adaptive),
+        paths,
+        workers,
+        cache,
+        initializer=ocr.init_worker,
+        initargs=(ocr_backend, ocr.worker_threads(workers), ocr_cache),
+        metrics=metrics,
+    )
+
+
+def iter_rows(
+    folder_path,
+    workers=1,
+    cache=None,
+    ocr_backend="pytesseract",
+    preprocessing="pil",
+    roi=False,
+    metrics=None,
+    ocr_cache=None,
+    adaptive=False,
+):
+    """Yield the rows extracted from the receipts of every store folder in a folder."""
+    for rows in extract_paths(
+        folder_paths(folder_path),
+        workers,
+        cache,
+        ocr_backend,
+        preprocessing,
+        roi,
+        metrics,
+        ocr_cache,
+        adaptive,
+    ):
+        yield from rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    import receipts
+
+    receipts.main(["stores", *sys.argv[1:]])
@@ -0,0 +1,42 @@
+import math
+
+
+def to_number(value):
+    """Convert a parsed value to a float, or NaN when it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(str(value).replace("$", ""))
+    except ValueError:
+        return math.nan
+
+
+class RowTable:
+    """Accumulate rows column by column and build a DataFrame from them only once."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._values = [[] for _ in self.columns]
+
+    def __len__(self):
+        return len(self._values[0])
+
+    def append(self, row):
+        """Add one row given as a sequence of values in column order."""
+        for values, value in zip(self._values, row, strict=True):
+            values.append(value)
+
+    def extend(self, rows):
+        """Add several rows given as sequences of values in column order."""
+        for row in rows:
+            self.append(row)
+
+    def to_frame(self):
+        """Build the DataFrame holding all the rows added so far."""
+        import pandas as pd
+
+        return pd.DataFrame(
+            dict(zip(self.columns, self._values, strict=True)), columns=self.columns
+        )
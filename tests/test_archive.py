@@ -0,0 +1,50 @@
+import os
+import tarfile
+import zipfile
+
+import benchmark
+import canac
+from archive import MemoryFile, content_digest, iter_members
+from pipeline import input_files
+
+
+def test_zip_members_filtered(tmp_path):
+    """Only the files of a zip archive with one of the extensions are read."""
+    path = str(tmp_path / "receipts.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("2023/a.PDF", b"a")
+        archive.writestr("2023/notes.txt", b"notes")
+        archive.writestr("__MACOSX/2023/._a.PDF", b"metadata")
+        archive.mkdir("2024")
+
+    members = list(iter_members(path, (".pdf",)))
+
+    assert [(member.name, member.data) for member in members] == [("2023/a.PDF", b"a")]
+
+
+def test_tar_members_read(tmp_path):
+    """The files of a compressed tar archive are read in the order they are stored."""
+    for name, data in (("a.pdf", b"a"), ("b.jpg", b"b"), ("c.pdf", b"c")):
+        (tmp_path / name).write_bytes(data)
+    path = str(tmp_path / "receipts.tar.gz")
+    with tarfile.open(path, "w:gz") as archive:
+        for name in ("c.pdf", "b.jpg", "a.pdf"):
+            archive.add(tmp_path / name, name)
+
+    members = list(input_files(path, (".pdf",)))
+
+    assert [member.name for member in members] == ["c.pdf", "a.pdf"]
+    assert content_digest(members[1]) == content_digest(str(tmp_path / "a.pdf"))
+
+
+def test_archive_extracted_as_its_folder(tmp_path):
+    """The receipts of a zip archive give the rows of the same receipts in a folder."""
+    folder = tmp_path / "receipts"
+    paths = benchmark.generate_corpus(folder, "canac", 2, item_count=2)
+    path = str(tmp_path / "receipts.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        for receipt in paths:
+            archive.write(receipt, os.path.basename(receipt))
+
+    assert list(canac.iter_rows(path)) == list(canac.iter_rows(str(folder)))
+    assert isinstance(next(iter(input_files(path, canac.EXTENSIONS))), MemoryFile)
@@ -0,0 +1,43 @@
+from test_home_depot import RECEIPT, fake_reader
+
+import async_pipeline
+import home_depot
+from parsing import Row
+
+
+def test_pdf_record(monkeypatch):
+    """A PDF extracted in a worker is recorded with its pages and its stages."""
+    text = RECEIPT.format(date="05-09-23")
+    monkeypatch.setattr(home_depot, "PdfReader", fake_reader([text, "CONDITIONS"]))
+
+    rows, record = async_pipeline._extract_pdf("home_depot", b"", "receipt.pdf")
+
+    assert rows == home_depot.parse_text(text, "receipt.pdf")
+    assert record["pages"] == 2
+    assert set(record["stages"]) == {"open", "extract_text", "parse"}
+
+
+def test_worker_records_added_up():
+    """The stages and counters of the workers are added to those of a receipt."""
+    receipt = async_pipeline.Receipt(0, "receipt.pdf")
+    receipt.stages["parse"] = 1.0
+
+    async_pipeline._record(
+        receipt, {"stages": {"parse": 0.5, "open": 0.25}, "pages": 2}
+    )
+    async_pipeline._record(receipt, {"stages": {"open": 0.25}, "pages": 1})
+
+    assert receipt.stages == {"parse": 1.5, "open": 0.5}
+    assert receipt.counts == {"pages": 3}
+
+
+def test_scanned_text_parsed_into_rows():
+    """The OCR text of a scanned receipt is parsed into Row, as in the worker pool."""
+    text = (
+        "CANAC\nDate 09-15-23\n#produit 123456\nVIS A BOIS 2,00\n1 x 2,00\nTOTAL 2,30"
+    )
+
+    rows = async_pipeline._parse_text("canac_scanned", text, "receipt.jpg")
+
+    assert rows and all(type(row) is Row for row in rows)
+    assert {row.file_name for row in rows} == {"receipt.jpg"}
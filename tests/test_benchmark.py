@@ -0,0 +1,35 @@
+import importlib
+
+import benchmark
+
+
+def file_bytes(paths):
+    """Return the content of every file."""
+    contents = []
+    for path in paths:
+        with open(path, "rb") as file:
+            contents.append(file.read())
+    return contents
+
+
+def test_corpus_deterministic(tmp_path):
+    """The same seed writes the same receipts, another seed other receipts."""
+    first = benchmark.generate_corpus(tmp_path / "first", "home_depot", 3, seed=1)
+    again = benchmark.generate_corpus(tmp_path / "again", "home_depot", 3, seed=1)
+    other = benchmark.generate_corpus(tmp_path / "other", "home_depot", 3, seed=2)
+
+    assert file_bytes(first) == file_bytes(again) != file_bytes(other)
+
+
+def test_corpus_parsed_by_its_extractor(tmp_path):
+    """Every receipt of a PDF corpus gives its items and its four sum lines."""
+    for name in ("canac", "home_depot"):
+        folder = tmp_path / name
+        benchmark.generate_corpus(folder, name, 3, item_count=4)
+        extractor = importlib.import_module(name)
+
+        rows = list(extractor.iter_rows(str(folder)))
+
+        text_sum = extractor.COLUMNS.index("TextSum")
+        assert sum(row[text_sum] == "TOTAL" for row in rows) == 3, name
+        assert sum(row[text_sum] == "" for row in rows) >= 3 * 2, name
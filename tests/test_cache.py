@@ -0,0 +1,107 @@
+import json
+import os
+import sqlite3
+
+from cache import ResultCache, TextCache
+from pipeline import extract_files
+
+ROWS = [["Canac", "2023-09-15", "a.pdf", "1", "VIS", 2.0, "UN", 1.5, 3.0, "", None]]
+
+# The size in bytes of ROWS once cached
+ROWS_SIZE = len(json.dumps(ROWS))
+
+
+def test_least_recently_used_dropped(tmp_path):
+    """Beyond its size, the cache drops the rows read or written the longest ago."""
+    path = str(tmp_path / "cache.sqlite3")
+    with ResultCache(path, "canac", 1, max_bytes=3 * ROWS_SIZE) as cache:
+        for digest in "abc":
+            cache.put(digest, ROWS)
+
+    with ResultCache(path, "canac", 1, max_bytes=3 * ROWS_SIZE) as cache:
+        assert cache.get("a") == ROWS
+        cache.put("d", ROWS)
+
+        assert [digest in cache for digest in "abcd"] == [True, False, False, True]
+
+
+def test_rows_of_the_run_kept_until_closed(tmp_path):
+    """The rows used since the cache was opened are only dropped once it is closed."""
+    path = str(tmp_path / "cache.sqlite3")
+    with ResultCache(path, "canac", 1, max_bytes=ROWS_SIZE * 3 // 2) as cache:
+        for digest in "abc":
+            cache.put(digest, ROWS)
+        assert [cache.get(digest) for digest in "abc"] == [ROWS] * 3
+
+    with ResultCache(path, "canac", 1) as cache:
+        assert [digest in cache for digest in "abc"] == [False, False, True]
+
+
+def test_cache_without_sizes_migrated(tmp_path):
+    """The rows cached before their sizes and uses were kept are read and sized."""
+    path = str(tmp_path / "cache.sqlite3")
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE results (extractor TEXT NOT NULL, digest TEXT NOT NULL,"
+            " parser_version INTEGER NOT NULL, rows TEXT NOT NULL,"
+            " PRIMARY KEY (extractor, digest))"
+        )
+        connection.execute(
+            "INSERT INTO results VALUES ('canac', 'a', 1, ?)", (json.dumps(ROWS),)
+        )
+    connection.close()
+
+    with ResultCache(path, "canac", 1) as cache:
+        assert cache.get("a") == ROWS
+        assert cache.size == ROWS_SIZE
+        cache.put("b", ROWS)
+        assert cache.get("b") == ROWS
+
+
+def test_entries_of_another_parser_version_dropped(tmp_path):
+    """Bumping the parser version of an extractor drops its rows, not the others'."""
+    path = str(tmp_path / "cache.sqlite3")
+    with ResultCache(path, "canac", 1) as cache:
+        cache.put("a", ROWS)
+    with ResultCache(path, "home_depot", 1) as cache:
+        cache.put("a", ROWS)
+
+    with ResultCache(path, "canac", 2) as cache:
+        assert "a" not in cache
+    with ResultCache(path, "home_depot", 1) as cache:
+        assert cache.get("a") == ROWS
+
+
+def test_files_extracted_once(tmp_path):
+    """A file already cached is not extracted again, even renamed."""
+    extracted = []
+
+    def extract_file(path):
+        extracted.append(os.path.basename(path))
+        return [["Canac", "2023-09-15", os.path.basename(path), 1.0]]
+
+    first, renamed = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    first.write_bytes(b"receipt")
+    with ResultCache(str(tmp_path / "cache.sqlite3"), "canac", 1) as cache:
+        assert list(extract_files(extract_file, [str(first)], cache=cache)) == [
+            [["Canac", "2023-09-15", "a.pdf", 1.0]]
+        ]
+        first.rename(renamed)
+        assert list(extract_files(extract_file, [str(renamed)], cache=cache)) == [
+            [["Canac", "2023-09-15", "b.pdf", 1.0]]
+        ]
+
+    assert extracted == ["a.pdf"]
+
+
+def test_least_recently_used_texts_dropped(tmp_path):
+    """Beyond its size, the text cache drops the texts read or written the longest ago."""
+    cache = TextCache(str(tmp_path / "texts.sqlite3"), max_bytes=3 * len("text"))
+    for key in "abc":
+        cache.put(key, "text", 91.5)
+
+    assert cache.get("a") == ("text", 91.5)
+    cache.put("d", "text")
+
+    assert [cache.get(key) is not None for key in "abcd"] == [True, False, True, True]
+    cache.close()
@@ -0,0 +1,39 @@
+import archive
+from cache import ResultCache
+from duplicates import DuplicateIndex, skip_duplicates
+from pipeline import extract_files
+
+
+def extract_text(path):
+    """Return a row per line of a text file."""
+    with open(path) as file:
+        return [["Store", "", path, line.strip()] for line in file]
+
+
+def test_files_hashed_once_with_the_cache(tmp_path, monkeypatch):
+    """A file hashed to find duplicates is not hashed again by the cache."""
+    paths = []
+    for name, text in [("a.txt", "one\n"), ("b.txt", "two\n"), ("c.txt", "one\n")]:
+        (tmp_path / name).write_text(text)
+        paths.append(str(tmp_path / name))
+    hashed = []
+    file_digest = archive.file_digest
+    monkeypatch.setattr(
+        archive, "file_digest", lambda path: hashed.append(path) or file_digest(path)
+    )
+    archive._path_digest.cache_clear()
+    index = DuplicateIndex()
+
+    with ResultCache(str(tmp_path / "cache.sqlite3"), "text", 1) as cache:
+        rows = list(
+            skip_duplicates(
+                lambda paths, cache: extract_files(extract_text, paths, 1, cache),
+                paths,
+                index,
+                cache=cache,
+            )
+        )
+
+    assert [file_rows[0][3] for file_rows in rows] == ["one", "two"]
+    assert index.duplicates == [("c.txt", "a.txt", "same content")]
+    assert sorted(hashed) == paths
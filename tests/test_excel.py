@@ -0,0 +1,61 @@
+import openpyxl
+
+from excel import upsert_rows, write_rows, write_sheets
+
+COLUMNS = ["Store", "Date", "File Name", "Total"]
+
+
+def sheet_rows(path, name):
+    """Return the values of the rows of a sheet of a workbook."""
+    workbook = openpyxl.load_workbook(path)
+    return [list(row) for row in workbook[name].iter_rows(values_only=True)]
+
+
+def test_upsert_keeps_sheets_added_by_hand(tmp_path):
+    """Sheets other than the combined and store sheets are left as they are."""
+    path = str(tmp_path / "receipts.xlsx")
+    rows = [["Canac", "2023-09-01", "a.pdf", 10.0], ["Home Depot", "", "b.pdf", 5.0]]
+    write_sheets(path, COLUMNS, rows, "All", ["Canac", "Home Depot"])
+    workbook = openpyxl.load_workbook(path)
+    notes = workbook.create_sheet("Notes")
+    notes.append(["Budget", 1000])
+    workbook.save(path)
+
+    count = upsert_rows(
+        path,
+        COLUMNS,
+        [["Canac", "2023-09-02", "a.pdf", 12.0]],
+        replaced={("Canac", "a.pdf")},
+        combined_sheet="All",
+        sheets=["Canac", "Home Depot"],
+    )
+
+    assert count == 1
+    assert sheet_rows(path, "All") == [
+        COLUMNS,
+        ["Home Depot", None, "b.pdf", 5],
+        ["Canac", "2023-09-02", "a.pdf", 12],
+    ]
+    assert sheet_rows(path, "Canac") == [COLUMNS, ["Canac", "2023-09-02", "a.pdf", 12]]
+    assert sheet_rows(path, "Home Depot") == [COLUMNS, ["Home Depot", None, "b.pdf", 5]]
+    assert sheet_rows(path, "Notes") == [["Budget", 1000]]
+
+
+def test_rows_streamed_into_workbook(tmp_path):
+    """The rows consumed from a generator are written under a bold header, NaN empty."""
+    path = str(tmp_path / "receipts.xlsx")
+    rows = (
+        ["Canac", "2023-09-01", f"{i}.pdf", float("nan") if i else 1.5]
+        for i in range(3)
+    )
+
+    count = write_rows(path, COLUMNS, rows)
+
+    assert count == 3
+    assert sheet_rows(path, "Sheet1") == [
+        COLUMNS,
+        ["Canac", "2023-09-01", "0.pdf", 1.5],
+        ["Canac", "2023-09-01", "1.pdf", None],
+        ["Canac", "2023-09-01", "2.pdf", None],
+    ]
+    assert openpyxl.load_workbook(path)["Sheet1"]["A1"].font.bold
@@ -0,0 +1,80 @@
+import math
+
+import home_depot
+
+RECEIPT = """THE HOME DEPOT
+MAGASIN 7001
+{date} 10:15
+VENTE CAISSIER 12
+727344065756  RUBAN A MESURER 25PI <A> 19,31
+720628320547  COLLE A CONSTRUCTION <A>
+2@5,00 10,00
+SOUS-TOTAL 29,31
+TPS/TVH 1,47
+TVP/TVQ 2,92
+TOTAL 33,70
+XXXXXXXXXXXX1234 MASTERCARD CAD$ 33,70
+CODE D'AUT 012345"""
+
+
+class Page:
+    """A page of a fake PDF, holding its text."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+
+def fake_reader(texts):
+    """Return a replacement of PdfReader opening a PDF of the given page texts."""
+
+    class Reader:
+        def __init__(self, path):
+            self.pages = [Page(text) for text in texts]
+
+    return Reader
+
+
+def test_single_page_parsed_as_before(monkeypatch):
+    """A receipt on its own page gives the rows parse_text() gives for that page."""
+    text = RECEIPT.format(date="05-09-23")
+    monkeypatch.setattr(home_depot, "PdfReader", fake_reader([text, "CONDITIONS"]))
+
+    rows = home_depot.extract_file("receipt.pdf")
+
+    assert rows == home_depot.parse_text(text, "receipt.pdf")
+
+
+def test_receipts_over_several_pages(monkeypatch):
+    """Receipts go on over the next pages, and the pages between them are skipped."""
+    first = RECEIPT.format(date="05-09-23")
+    second = RECEIPT.format(date="06-09-23")
+    split = second.index("TPS/TVH")
+    texts = ["", first, "CONDITIONS\nterms", second[: split - 1], "", second[split:]]
+    monkeypatch.setattr(home_depot, "PdfReader", fake_reader(texts))
+
+    rows = home_depot.extract_file("statement.pdf")
+
+    expected = home_depot.parse_text(first, "statement.pdf")
+    expected += home_depot.parse_text(second, "statement.pdf")
+    assert rows == expected
+    for ranges in ([(0, 3), (3, 6)], [(0, 4), (4, 6)], [(i, i + 1) for i in range(6)]):
+        parts = []
+        for pages in ranges:
+            parts += home_depot.extract_file("statement.pdf", pages=pages)
+        assert parts == expected
+
+
+def test_incomplete_totals():
+    """Totals missing from a receipt cut short give NaN sums instead of an error."""
+    text = RECEIPT.format(date="05-09-23")
+    text = text[: text.index("TVP/TVQ")] + "XXXXXXXXXXXX1234 MASTERCARD CAD$ 33,70"
+
+    rows = home_depot.parse_text(text, "receipt.pdf")
+
+    sums = [(row[8], row[9]) for row in rows[2:]]
+    assert sums[:2] == [("SOUS TOTAL", 29.31), ("TPS/TVH", 1.47)]
+    assert [text_sum for text_sum, _ in sums[2:]] == ["TVP/TVQ", "TOTAL"]
+    assert all(math.isnan(amount) for _, amount in sums[2:])
@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from PIL import Image
+
+import canac_scanned
+import ocr
+from parsing import Row
+
+# The synthetic batch: that many 12 MP photos, each 12 MiB once decoded to grayscale
+PHOTO_COUNT = 12
+PHOTO_SHAPE = (4000, 3000, 3)
+
+# The peak RSS of the worker scanning the batch, in MiB: about that of the interpreter
+# and of a few buffers of the largest photo, and less than keeping the photos decoded
+MAX_RSS_MIB = 160
+
+TEXT = """CANAC
+Date 09-15-23
+#produit 123456
+VIS A BOIS 2,00
+1 x 2,00
+TOTAL 2,30
+Merci"""
+
+
+class FakeEngine:
+    """An OCR engine reading the same text in every image, without tesseract."""
+
+    name = "fake"
+
+    def image_to_string(self, image, psm=None):
+        """Return the text of every receipt."""
+        return TEXT
+
+    def version(self):
+        """Return the version of the engine."""
+        return "1"
+
+    def close(self):
+        """Release nothing."""
+
+
+def peak_rss():
+    """Return the peak RSS of this process in MiB, not counting the process it forked from."""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+def scan(paths):
+    """Scan receipts in this process, returning their rows and the peak RSS in MiB."""
+    ocr.create_engine = lambda backend: FakeEngine()
+    rows = [row for rows in canac_scanned.extract_paths(paths) for row in rows]
+    return rows, peak_rss()
+
+
+@pytest.fixture(scope="module")
+def photos(tmp_path_factory):
+    """Write the synthetic photos of receipts, dark lines of text on a light page."""
+    import numpy as np
+
+    folder = tmp_path_factory.mktemp("photos")
+    photo = np.full(PHOTO_SHAPE, 235, np.uint8)
+    rng = np.random.default_rng(0)
+    for line in range(200, PHOTO_SHAPE[0] - 200, 60):
+        photo[line : line + 25, 300 : rng.integers(600, PHOTO_SHAPE[1] - 300)] = 40
+    image = Image.fromarray(photo)
+    paths = []
+    for i in range(PHOTO_COUNT):
+        paths.append(str(folder / f"{i:05}.jpg"))
+        image.save(paths[-1], quality=85)
+    return paths
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/status"), reason="the peak RSS is read from /proc"
+)
+def test_scanning_under_a_fixed_rss_ceiling(photos):
+    """A batch of photos is scanned without keeping their images, under MAX_RSS_MIB."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        rows, peak_rss = executor.submit(scan, photos).result()
+
+    assert len(rows) == 5 * PHOTO_COUNT
+    assert all(type(row) is Row and isinstance(row.file_name, str) for row in rows)
+    assert peak_rss < MAX_RSS_MIB
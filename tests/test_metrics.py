@@ -0,0 +1,52 @@
+import metrics
+from metrics import Metrics, count, measured, merge_records, stage
+
+
+def extract_file(path):
+    """Return the rows of a fake receipt of two pages, timing its stages."""
+    for _ in range(2):
+        count("pages")
+        with stage("extract_text"):
+            pass
+    return [[path], [path]]
+
+
+def test_file_recorded(tmp_path):
+    """A file extracted while measured is recorded with its stages, pages and rows."""
+    path = tmp_path / "receipt.pdf"
+    path.write_bytes(b"%PDF")
+
+    rows, record = measured(extract_file, str(path))
+
+    assert rows == [[str(path)], [str(path)]]
+    assert record["file"] == "receipt.pdf" and record["bytes"] == 4
+    assert record["pages"] == 2 and record["rows"] == 2
+    assert set(record["stages"]) == {"extract_text"}
+
+
+def test_nothing_recorded_outside_of_a_file():
+    """Outside of a measured file, stages and counters are no-ops."""
+    assert stage("parse") is stage("ocr")
+    count("pages")
+    assert metrics._current is None
+
+
+def test_parts_merged_and_summarized():
+    """The parts of a file add up to its record, and the records to the summary."""
+    parts = [
+        {"file": "a.pdf", "bytes": 10, "stages": {"parse": 1.0}, "pages": 2, "rows": 3},
+        {"file": "a.pdf", "bytes": 10, "stages": {"parse": 0.5}, "pages": 1, "rows": 1},
+    ]
+    for part in parts:
+        part["wall"] = 1.0
+
+    record = merge_records(parts)
+    run = Metrics()
+    run.add(record)
+    run.add({"file": "b.pdf", "bytes": 5, "stages": {}, "rows": 2, "cached": True})
+    summary = run.summary()
+
+    assert record["stages"] == {"parse": 1.5}
+    assert (record["pages"], record["rows"], record["parts"]) == (3, 4, 2)
+    assert (summary["files"], summary["cached"], summary["rows"]) == (2, 1, 6)
+    assert summary["slowest"] == [{"file": "a.pdf", "wall": 2.0}]
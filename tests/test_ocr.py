@@ -0,0 +1,178 @@
+import os
+import sys
+from io import BytesIO
+
+from PIL import Image
+
+import home_depot_scanned
+import ocr
+from cache import TextCache
+
+
+class FakeEngine:
+    """An OCR engine reading the given texts in turn, without tesseract."""
+
+    name = "fake"
+
+    def __init__(self, *texts, lines=()):
+        self.texts = list(texts)
+        self.lines = list(lines)
+        self.images = []
+        self.closed = False
+
+    def image_to_string(self, image, psm=None):
+        """Return the next text."""
+        self.images.append(image)
+        return self.texts.pop(0)
+
+    def image_to_lines(self, image, psm=None):
+        """Return the lines of the layout pass."""
+        return self.lines
+
+    def version(self):
+        """Return the version of the engine."""
+        return "1"
+
+    def close(self):
+        """Record that the engine is closed."""
+        self.closed = True
+
+
+def use_engine(monkeypatch, engine):
+    """Make the engine the one of this process for a test."""
+    monkeypatch.setattr(ocr, "create_engine", lambda backend: engine)
+    monkeypatch.setattr(ocr, "_engine", engine)
+    monkeypatch.setattr(ocr, "_engine_version", None)
+
+
+def test_one_thread_per_worker(monkeypatch):
+    """With several workers every tesseract run is limited to one thread."""
+    use_engine(monkeypatch, FakeEngine())
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+
+    ocr.init_worker("pytesseract", ocr.worker_threads(1))
+    assert "OMP_THREAD_LIMIT" not in os.environ
+
+    ocr.init_worker("pytesseract", ocr.worker_threads(4))
+    assert os.environ["OMP_THREAD_LIMIT"] == "1"
+
+
+def test_tesserocr_falls_back_to_pytesseract(monkeypatch, capsys):
+    """Without tesserocr installed, its backend runs tesseract through pytesseract."""
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+
+    engine = ocr.create_engine("tesserocr")
+
+    assert engine.name == "pytesseract"
+    assert "falling back to pytesseract" in capsys.readouterr().out
+
+
+def test_engine_of_the_process_replaced(monkeypatch):
+    """Setting up a worker again closes the engine it was using."""
+    first, second = FakeEngine(), FakeEngine("text")
+    use_engine(monkeypatch, first)
+    monkeypatch.setattr(ocr, "create_engine", lambda backend: second)
+
+    ocr.init_worker("tesserocr")
+
+    assert first.closed and not second.closed
+    assert ocr.image_to_string("image") == "text"
+
+
+def test_only_regions_recognised(monkeypatch):
+    """Only the bands of the lines found, with a margin, are recognised at full size."""
+    lines = [("date", 0, 10), ("items", 20, 30), ("ad", 40, 50), ("total", 60, 70)]
+    engine = FakeEngine("items", "total", lines=lines)
+    use_engine(monkeypatch, engine)
+
+    text = ocr.recognize_regions(
+        Image.new("L", (300, 300)), lambda texts: [(1, 1), (3, 3)]
+    )
+
+    assert text == "items\ntotal"
+    assert [image.size for image in engine.images] == [(300, 60), (300, 60)]
+
+
+def test_whole_image_recognised_without_regions(monkeypatch):
+    """The whole image is recognised when no region is found in it."""
+    engine = FakeEngine("text", lines=[("logo", 0, 10)])
+    use_engine(monkeypatch, engine)
+
+    text = ocr.recognize_regions(Image.new("L", (300, 300)), lambda texts: None)
+
+    assert text == "text"
+    assert [image.size for image in engine.images] == [(300, 300)]
+
+
+def test_home_depot_regions():
+    """The regions of a Home Depot receipt are its date, and its items and totals."""
+    lines = [
+        "THE HOME DEPOT",
+        "7045 15-09-23",
+        "ad",
+        "VENTE CAISSIER",
+        "item",
+        "CAD$ 4,60",
+    ]
+
+    assert home_depot_scanned.find_text_regions(lines) == [(1, 1), (3, 5)]
+    assert home_depot_scanned.find_text_regions(["THE HOME DEPOT"]) is None
+
+
+def test_text_of_an_image_recognised_once(monkeypatch, tmp_path):
+    """The text of an image is read from the text cache, unless its settings change."""
+    engine = FakeEngine("first", "second")
+    use_engine(monkeypatch, engine)
+    text_cache = TextCache(str(tmp_path / "texts.sqlite3"))
+    monkeypatch.setattr(ocr, "_text_cache", text_cache)
+    image_file = BytesIO(b"image")
+
+    texts = [
+        ocr.recognize_file(image_file, lambda file: Image.new("L", (10, 10)), settings)
+        for settings in ("pil", "pil", "opencv")
+    ]
+
+    assert texts == [("first", None), ("first", None), ("second", None)]
+    assert len(engine.images) == 2
+    text_cache.close()
+
+
+def attempt(text, confidence, tried):
+    """Return an OCR attempt giving a text and its confidence, recording that it ran."""
+
+    def run():
+        tried.append(text)
+        return text, confidence
+
+    return run
+
+
+def test_escalated_until_complete_and_confident():
+    """The attempts run from the cheapest until one is parsed completely and confidently."""
+    tried = []
+    attempts = [
+        attempt("partial", 95, tried),
+        attempt("unsure", 40, tried),
+        attempt("complete", 90, tried),
+        attempt("costly", 99, tried),
+    ]
+
+    rows = ocr.escalate(attempts, lambda text: [text], lambda rows: rows != ["partial"])
+
+    assert rows == ["complete"]
+    assert tried == ["partial", "unsure", "complete"]
+
+
+def test_best_attempt_kept():
+    """When no attempt is good enough, the most confident complete one is kept."""
+    tried = []
+    attempts = [
+        attempt("partial", 95, tried),
+        attempt("unsure", 40, tried),
+        attempt("doubtful", 60, tried),
+    ]
+
+    rows = ocr.escalate(attempts, lambda text: [text], lambda rows: rows != ["partial"])
+
+    assert rows == ["doubtful"]
+    assert len(tried) == 3
@@ -0,0 +1,61 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import parquet
+
+COLUMNS = ["Store", "Date", "File Name", "Description", "Total"]
+
+
+def receipt(name, description, total, date="2023-09-01"):
+    """Return the row of a receipt with a single item."""
+    return [["Canac", date, name, description, total]]
+
+
+def read_rows(folder):
+    """Return the file name and description of the rows of a dataset, sorted."""
+    table = pq.read_table(folder, columns=["File Name", "Description"])
+    return sorted(zip(*table.to_pydict().values(), strict=True))
+
+
+def write(folder, rows, digest):
+    """Write the rows of a receipt whose file has the given digest."""
+    return parquet.write_rows(folder, COLUMNS, rows, digest_of=lambda row: digest)
+
+
+def test_receipts_with_the_same_name_kept(tmp_path):
+    """A receipt is replaced by its own content again, not by another of its name."""
+    folder = str(tmp_path / "data")
+    write(folder, receipt("a.pdf", "first", 1.0), "digest-1")
+    write(folder, receipt("a.pdf", "second", 2.0), "digest-2")
+    write(folder, receipt("a.pdf", "first again", 1.0), "digest-1")
+
+    assert read_rows(folder) == [("a.pdf", "first again"), ("a.pdf", "second")]
+
+
+def test_rows_without_digest_replaced_by_name(tmp_path):
+    """The rows written before the digests were recorded are matched by name."""
+    folder = tmp_path / "data" / "year=2023" / "month=9"
+    folder.mkdir(parents=True)
+    legacy = pa.table(
+        {
+            "Store": ["Canac", "Canac"],
+            "Date": ["2023-09-01", "2023-09-01"],
+            "File Name": ["a.pdf", "b.pdf"],
+            "Description": ["old", "other"],
+        }
+    )
+    pq.write_table(legacy, folder / "part-legacy-0.parquet")
+
+    write(str(tmp_path / "data"), receipt("a.pdf", "new", 1.0), "digest-1")
+
+    assert read_rows(str(folder)) == [("a.pdf", "new"), ("b.pdf", "other")]
+
+
+def test_only_the_months_written_are_read(tmp_path):
+    """The files of the months a run does not write to are left unread."""
+    folder = tmp_path / "data"
+    other_month = folder / "year=2023" / "month=8"
+    other_month.mkdir(parents=True)
+    (other_month / "part-unreadable-0.parquet").write_bytes(b"not parquet")
+
+    assert write(str(folder), receipt("a.pdf", "new", 1.0), "digest-1") == 1
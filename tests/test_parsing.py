@@ -0,0 +1,80 @@
+import math
+
+import canac_scanned
+import home_depot_scanned
+from parsing import RowLayout, find_markers
+
+CANAC_TEXT = """CANAC
+Date 09-15-23
+#produit 123456
+VIS A BOIS 4,00
+2 x 2,00
+SOUS-TOTAL 4,00
+TOTAL 4,60
+Merci"""
+
+HOME_DEPOT_TEXT = """THE HOME DEPOT
+7045 00042 15-09-23 10:42
+VENTE CAISSIER 042
+123456789012  VIS A BOIS <A>
+2@2,00 4,00
+SOUS-TOTAL 4,00
+TPS/TVH 0,20
+TVP/TVQ 0,40
+TOTAL 4,60
+XXXX1234 MASTERCARD CAD$ 4,60
+CODE D'AUT 012345"""
+
+
+def is_number(value):
+    """Return whether a value is a float, NaN included."""
+    return isinstance(value, float)
+
+
+def test_rows_typed():
+    """Item and sum rows hold floats in their number columns, NaN when absent."""
+    rows = RowLayout("Canac", unit=True)
+
+    item = rows.item_row("2023-09-15", "a.pdf", "1", "VIS", "2", "1.5", "3", "UN")
+    assert item[:10] == [
+        "Canac",
+        "2023-09-15",
+        "a.pdf",
+        "1",
+        "VIS",
+        2.0,
+        "UN",
+        1.5,
+        3.0,
+        "",
+    ]
+    assert math.isnan(item[10])
+    total = rows.sum_row("2023-09-15", "a.pdf", "TOTAL", None)
+    assert total[:5] == ["Canac", "2023-09-15", "a.pdf", "", ""]
+    assert total[6] == "" and total[9] == "TOTAL"
+    assert all(math.isnan(total[index]) for index in (5, 7, 8, 10))
+
+
+def test_scanned_rows_typed():
+    """The scanned extractors write numbers, not strings, in their number columns."""
+    for extractor, text in [
+        (canac_scanned, CANAC_TEXT),
+        (home_depot_scanned, HOME_DEPOT_TEXT),
+    ]:
+        rows = extractor.parse_text(text, "a.jpg")
+        columns = extractor.COLUMNS
+        for column in ("Quantity", "Unit Price", "Total", "Sum"):
+            index = columns.index(column)
+            assert all(is_number(row[index]) for row in rows), (extractor, column)
+        assert rows[0][columns.index("Quantity") : columns.index("Total") + 1] == [
+            2.0,
+            2.0,
+            4.0,
+        ]
+
+
+def test_find_markers():
+    """Every marker found is located by its line and its position in the line."""
+    markers = find_markers(HOME_DEPOT_TEXT, ("VENTE C", "CAD$", "MISSING"))
+
+    assert markers == {"VENTE C": (2, 0), "CAD$": (9, 20)}
@@ -0,0 +1,43 @@
+import time
+
+from pipeline import extract_files, map_ordered
+
+
+def square(number):
+    """Return the square of a number, the multiples of 3 taking longer."""
+    time.sleep(0.01 * (number % 3 == 0))
+    return number * number
+
+
+def extract_file(path):
+    """Return the rows of a fake receipt, one per character of its name."""
+    return [["Store", "", path, character] for character in path]
+
+
+def test_results_in_order():
+    """The results of the process pool come in the order of the items."""
+    assert list(map_ordered(square, range(20), workers=2)) == [n * n for n in range(20)]
+
+
+def test_items_consumed_lazily():
+    """Only a few items are handed to the pool ahead of the results consumed."""
+    consumed = []
+
+    def items():
+        for number in range(100):
+            consumed.append(number)
+            yield number
+
+    results = map_ordered(square, items(), workers=2)
+    assert next(results) == 0
+    assert len(consumed) <= 5
+    results.close()
+
+
+def test_files_extracted_in_parallel_in_order():
+    """The rows of every file come in the order of the paths, whatever the workers."""
+    paths = [f"receipt-{i}.pdf" for i in range(10)]
+
+    expected = [extract_file(path) for path in paths]
+
+    assert list(extract_files(extract_file, paths, workers=3)) == expected
@@ -0,0 +1,48 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import preprocess
+import scanned
+
+
+@pytest.fixture
+def photo(tmp_path):
+    """Write a noisy grayscale photo of lines of text, returning its path."""
+    rng = np.random.default_rng(0)
+    pixels = np.full((200, 300), 220, np.uint8)
+    for top in range(20, 180, 20):
+        pixels[top : top + 8, 30 : rng.integers(100, 280)] = 40
+    pixels = (pixels + rng.integers(0, 20, pixels.shape)).clip(0, 255).astype(np.uint8)
+    path = str(tmp_path / "photo.png")
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+def test_opencv_matches_pil(photo):
+    """The OpenCV preprocessing gives nearly the image the PIL chain gives."""
+    opencv = np.asarray(preprocess.prepare_image(photo, 1.3, 1.5), dtype=int)
+    pil = np.asarray(scanned.prepare_image_for_ocr(photo, 1.3, 1.5), dtype=int)
+
+    assert opencv.shape == pil.shape
+    assert np.abs(opencv - pil).mean() < 2
+
+
+def test_binarized_image(photo):
+    """The binarized image is only black and white, and read from memory too."""
+    with open(photo, "rb") as file:
+        image = preprocess.prepare_image(BytesIO(file.read()), 1.3, 1.5, binarize=True)
+
+    assert image.mode == "L"
+    assert set(np.unique(np.asarray(image))) <= {0, 255}
+
+
+def test_undecodable_image(tmp_path):
+    """A file that is not an image is an error."""
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"not an image")
+
+    with pytest.raises(ValueError):
+        preprocess.prepare_image(str(path), 1.3, 1.5)
@@ -0,0 +1,54 @@
+import importlib
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import receipts
+
+
+def test_extractors_imported_lazily():
+    """The command line is parsed without importing any extractor or its libraries."""
+    modules = ("canac", "home_depot_scanned", "pandas", "pdfplumber", "PyPDF2", "cv2")
+    check = f"import receipts, sys; print([m for m in {modules!r} if m in sys.modules])"
+
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        cwd=Path(__file__).parents[1],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_every_source_has_an_extractor():
+    """Every subcommand names an extractor module with what the command uses of it."""
+    for module_name, _, _, _ in receipts.SOURCES.values():
+        extractor = importlib.import_module(module_name)
+        for name in ("COLUMNS", "PARSER_VERSION", "EXTENSIONS", "extract_paths"):
+            assert hasattr(extractor, name), (module_name, name)
+
+
+def test_options_refused_together():
+    """The options that cannot be used together are refused before any extraction."""
+    for argv in (
+        ["canac", "--append", "--format", "parquet"],
+        ["canac-scanned", "--pipeline", "async", "--roi"],
+    ):
+        with pytest.raises(SystemExit):
+            receipts.main(argv)
+
+
+def test_rows_cached_per_ocr_setting():
+    """The rows of a scanned extractor are cached apart for every OCR setting."""
+    options = {"ocr_backend": "pytesseract", "preprocessing": "pil", "roi": False}
+    names = {
+        receipts.cache_name("canac_scanned", {**options, "adaptive": adaptive})
+        for adaptive in (False, True)
+    }
+
+    assert len(names) == 2
+    assert receipts.cache_name("canac", {}) == "canac"
@@ -0,0 +1,40 @@
+import math
+
+import pandas as pd
+
+from canac import COLUMNS
+from reconcile import ITEMS_SUM_COLUMN, STATUS_COLUMN, reconcile
+
+NAN = float("nan")
+
+
+def sum_row(file_name, label, amount):
+    """Return a sum line of a Canac receipt."""
+    return ["Canac", "2023-09-01", file_name, "", "", NAN, "", NAN, NAN, label, amount]
+
+
+def test_empty_batch():
+    """An empty batch is reconciled into an empty frame with the added columns."""
+    result = reconcile(pd.DataFrame([], columns=COLUMNS))
+
+    assert result.empty
+    assert ITEMS_SUM_COLUMN in result.columns
+    assert STATUS_COLUMN in result.columns
+
+
+def test_batch_without_items():
+    """Receipts with no items have no Items Sum, but their sums are still inferred."""
+    frame = pd.DataFrame(
+        [sum_row("a.pdf", "TOTAL", 11.5), sum_row("b.pdf", "TOTAL", NAN)],
+        columns=COLUMNS,
+    )
+
+    result = reconcile(frame)
+
+    assert all(math.isnan(value) for value in result[ITEMS_SUM_COLUMN])
+    statuses = result.groupby("Filename")[STATUS_COLUMN].first()
+    assert statuses.to_dict() == {"a.pdf": "ok", "b.pdf": "incomplete"}
+    subtotal = result[
+        (result["Filename"] == "a.pdf") & (result["TextSum"] == "SOUS TOTAL")
+    ]
+    assert subtotal["Sum"].tolist() == [10.0]
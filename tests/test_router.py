@@ -0,0 +1,38 @@
+from PIL import Image
+
+import benchmark
+import canac
+import router
+
+
+def test_receipts_routed(tmp_path):
+    """A PDF with a text layer is parsed, a scanned PDF or a photo recognised."""
+    (text_pdf,) = benchmark.generate_corpus(tmp_path, "canac", 1, item_count=2)
+    scanned_pdf = str(tmp_path / "scanned.pdf")
+    Image.new("L", (200, 100), 255).save(scanned_pdf)
+    photo = str(tmp_path / "photo.jpg")
+    Image.new("L", (200, 100), 255).save(photo)
+
+    assert router.route(text_pdf) == "text"
+    assert router.route(scanned_pdf) == "ocr"
+    assert router.route(photo) == "ocr"
+
+
+def test_text_pdf_extracted_from_its_text(tmp_path):
+    """A PDF with a text layer gives the rows of its text extractor."""
+    (path,) = benchmark.generate_corpus(tmp_path, "canac", 1, item_count=2)
+
+    rows = router.extract_file("canac", "canac_scanned", path)
+
+    assert rows == canac.extract_file(path)
+
+
+def test_rows_converted_by_alias():
+    """Columns are matched by name or alias, and the missing ones left empty."""
+    rows = [["a.jpg", "123", 2]]
+
+    converted = router.convert_rows(
+        rows, ["Filename", "Article", "Quantité"], ["File Name", "Quantité", "Total"]
+    )
+
+    assert converted == [["a.jpg", 2, ""]]
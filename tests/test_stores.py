@@ -0,0 +1,50 @@
+import os
+import zipfile
+
+import benchmark
+import canac
+import home_depot
+import stores
+
+
+def receipts_folder(folder):
+    """Write a receipt of each store in its folder, and one in a folder of no store."""
+    for name, store_folder in (("canac", "Canac"), ("home_depot", "HomeDepot")):
+        benchmark.generate_corpus(folder / store_folder, name, 1, item_count=2)
+    benchmark.generate_corpus(folder / "Other", "canac", 1, item_count=2)
+
+
+def test_receipts_of_every_store_found(tmp_path):
+    """Only the receipts of the store folders are extracted, in a folder or an archive."""
+    receipts_folder(tmp_path / "receipts")
+    path = str(tmp_path / "receipts.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        for root, _, names in os.walk(tmp_path / "receipts"):
+            for name in names:
+                full_path = os.path.join(root, name)
+                archive.write(full_path, os.path.relpath(full_path, tmp_path))
+
+    paths = stores.folder_paths(str(tmp_path / "receipts"))
+    members = list(stores.folder_paths(path))
+
+    assert [stores.store_of(path) for path in paths] == ["Canac", "Home Depot"]
+    assert [stores.store_of(member.name) for member in members] == [
+        "Canac",
+        "Home Depot",
+    ]
+
+
+def test_rows_of_every_store_in_the_same_columns(tmp_path):
+    """The rows of every store are given by its extractor, in the columns of all stores."""
+    receipts_folder(tmp_path)
+    canac_path, home_depot_path = stores.folder_paths(str(tmp_path))
+
+    canac_rows = stores.extract_file(canac_path)
+    home_depot_rows = stores.extract_file(home_depot_path)
+
+    udm = stores.COLUMNS.index("UdM")
+    assert canac_rows == canac.extract_file(canac_path)
+    assert [row[:udm] + row[udm + 1 :] for row in home_depot_rows] == list(
+        home_depot.extract_file(home_depot_path)
+    )
+    assert {row[udm] for row in home_depot_rows} == {""}
@@ -0,0 +1,38 @@
+import math
+
+import pandas as pd
+import pytest
+
+from table import RowTable, to_number
+
+COLUMNS = ["Store", "File Name", "Total"]
+
+
+def test_frame_built_from_columns():
+    """The frame holds the rows appended, in order, as DataFrame() would build it."""
+    rows = [["Canac", "a.pdf", 1.5], ["Home Depot", "b.pdf", 2.0]]
+    table = RowTable(COLUMNS)
+    table.append(rows[0])
+    table.extend(rows[1:])
+
+    assert len(table) == 2
+    pd.testing.assert_frame_equal(table.to_frame(), pd.DataFrame(rows, columns=COLUMNS))
+
+
+def test_empty_frame_has_columns():
+    """A table without rows still gives a frame with its columns."""
+    frame = RowTable(COLUMNS).to_frame()
+
+    assert frame.empty and list(frame.columns) == COLUMNS
+
+
+def test_row_of_another_width_refused():
+    """A row without a value for every column is an error, not a shifted row."""
+    with pytest.raises(ValueError):
+        RowTable(COLUMNS).append(["Canac", "a.pdf"])
+
+
+def test_to_number():
+    """Numbers, numeric strings and dollar amounts are floats, the rest NaN."""
+    assert [to_number(value) for value in (2, "1.5", "$3")] == [2.0, 1.5, 3.0]
+    assert all(math.isnan(to_number(value)) for value in ("", None, "abc"))
@@ -0,0 +1,68 @@
+import os
+from types import SimpleNamespace
+
+import openpyxl
+
+from watch import Output, PollingWatcher
+
+COLUMNS = ["Store", "Date", "File Name", "Total"]
+
+
+def fake_extractor(totals):
+    """Return an extractor giving every receipt a row with its total, failing without."""
+
+    def extract_paths(paths, workers=1, cache=None):
+        for path in paths:
+            name = os.path.basename(path)
+            if name not in totals:
+                raise ValueError(f"{name} is incomplete")
+            yield [["Canac", "2023-09-01", name, totals[name]]]
+
+    return SimpleNamespace(
+        COLUMNS=COLUMNS, EXTENSIONS=(".pdf",), extract_paths=extract_paths
+    )
+
+
+def workbook_rows(path):
+    """Return the rows of the first sheet of a workbook, after its header."""
+    sheet = openpyxl.load_workbook(path).worksheets[0]
+    return [list(row) for row in sheet.iter_rows(min_row=2, values_only=True)]
+
+
+def test_workbook_kept_up_to_date(tmp_path):
+    """Receipts added, changed and removed are added, replaced and removed."""
+    path = str(tmp_path / "canac.xlsx")
+    totals = {"a.pdf": 1, "b.pdf": 2}
+    output = Output(fake_extractor(totals), str(tmp_path), path)
+
+    assert output.update(["a.pdf", "b.pdf"], []) == (2, 2)
+    totals["a.pdf"] = 3
+    assert output.update(["a.pdf"], ["b.pdf"]) == (1, 1)
+
+    assert workbook_rows(path) == [["Canac", "2023-09-01", "a.pdf", 3]]
+    assert set(Output(fake_extractor(totals), str(tmp_path), path).receipts) == {
+        "a.pdf"
+    }
+
+
+def test_failing_receipt_left_out(tmp_path, capsys):
+    """A receipt that cannot be extracted is reported, and the others written."""
+    path = str(tmp_path / "canac.xlsx")
+    output = Output(fake_extractor({"a.pdf": 1}), str(tmp_path), path)
+
+    assert output.update(["a.pdf", "partial.pdf"], []) == (1, 1)
+
+    assert "partial.pdf" in capsys.readouterr().out
+    assert workbook_rows(path) == [["Canac", "2023-09-01", "a.pdf", 1]]
+
+
+def test_polling_finds_changes(tmp_path):
+    """Listing a folder again finds the files added, changed and removed."""
+    (tmp_path / "a.pdf").write_bytes(b"a")
+    watcher = PollingWatcher([str(tmp_path)], interval=0)
+
+    (tmp_path / "b.pdf").write_bytes(b"b")
+    (tmp_path / "a.pdf").unlink()
+
+    assert watcher.wait() == {str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")}
+    assert watcher.wait() == set()
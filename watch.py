@@ -0,0 +1,273 @@
+import os
+import select
+import struct
+import tempfile
+import time
+
+from excel import ExistingWorkbook, upsert_rows, write_rows
+from pipeline import list_files
+
+# The inotify events of a watched folder that can add, change or remove a receipt
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCHED_EVENTS = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+# The header of an inotify event: watch descriptor, mask, cookie and name length
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Folders watched with inotify, waking up only when one of their files changes."""
+
+    def __init__(self, folders):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.folders = {}
+        for folder in folders:
+            descriptor = libc.inotify_add_watch(
+                self.fd, os.fsencode(folder), WATCHED_EVENTS
+            )
+            if descriptor < 0:
+                error = ctypes.get_errno()
+                self.close()
+                raise OSError(error, os.strerror(error), folder)
+            self.folders[descriptor] = folder
+
+    def wait(self, timeout=None):
+        """Return the paths changed within the timeout in seconds, or forever if None."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, 1 << 16)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            descriptor, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if descriptor in self.folders and name:
+                paths.add(os.path.join(self.folders[descriptor], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Folders whose files are listed again at a fixed interval to find the changes."""
+
+    def __init__(self, folders, interval):
+        self.folders = folders
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        """Return the size and modification time of every file, by path."""
+        snapshot = {}
+        for folder in self.folders:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout=None):
+        """Return the paths changed within the timeout in seconds, or the interval."""
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self.scan()
+        changed = {
+            path
+            for path in snapshot.keys() | self.snapshot.keys()
+            if snapshot.get(path) != self.snapshot.get(path)
+        }
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(folders, poll_interval, polling=False):
+    """Watch folders with inotify, or by polling them where inotify is not available."""
+    if not polling:
+        try:
+            return InotifyWatcher(folders)
+        except (AttributeError, OSError) as error:
+            print(f"inotify is not available ({error}), polling the folders instead")
+    return PollingWatcher(folders, poll_interval)
+
+
+class Output:
+    """The receipts of one extractor, kept up to date in a workbook."""
+
+    def __init__(self, extractor, folder, path, options=None, cache=None):
+        self.extractor = extractor
+        self.folder = folder
+        self.path = path
+        self.options = options or {}
+        self.cache = cache
+        # The (store, file name) of the receipts in the workbook, by file name
+        self.receipts = {}
+        self.written_at = None
+        if os.path.exists(path):
+            for store, name in ExistingWorkbook(path).receipts():
+                self.receipts.setdefault(name, set()).add((store, name))
+            self.written_at = os.path.getmtime(path)
+
+    def is_written(self, path, stat):
+        """Return whether a receipt is in the workbook, unchanged since it was written."""
+        return (
+            os.path.basename(path) in self.receipts
+            and self.written_at is not None
+            and stat.st_mtime <= self.written_at
+        )
+
+    def update(self, paths, removed_paths, workers=1):
+        """Extract the receipts added or changed, remove the removed ones and save."""
+        replaced = set()
+        for path in removed_paths:
+            replaced.update(self.receipts.pop(os.path.basename(path), ()))
+        try:
+            extracted = list(
+                self.extractor.extract_paths(paths, workers, self.cache, **self.options)
+            )
+        except Exception:
+            # Extract the receipts one by one to find the ones that fail
+            extracted = []
+            for path in paths:
+                try:
+                    extracted.extend(
+                        self.extractor.extract_paths(
+                            [path], 1, self.cache, **self.options
+                        )
+                    )
+                except Exception as error:
+                    print(f"Could not extract '{path}': {error!r}")
+                    extracted.append(None)
+        count = 0
+        new_rows = []
+        for path, rows in zip(paths, extracted, strict=True):
+            if rows is not None:
+                name = os.path.basename(path)
+                replaced.update(self.receipts.pop(name, ()))
+                self.receipts[name] = {(row[0], row[2]) for row in rows}
+                new_rows.extend(rows)
+                count += 1
+        return count, self.save(new_rows, replaced)
+
+    def save(self, rows, replaced=()):
+        """Append rows to the workbook, removing the rows of the replaced receipts."""
+        if os.path.exists(self.path):
+            count = upsert_rows(self.path, self.extractor.COLUMNS, rows, replaced)
+        else:
+            folder = os.path.dirname(self.path) or "."
+            fd, temporary_path = tempfile.mkstemp(suffix=".xlsx", dir=folder)
+            os.close(fd)
+            try:
+                count = write_rows(temporary_path, self.extractor.COLUMNS, rows)
+                os.replace(temporary_path, self.path)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+        self.written_at = os.path.getmtime(self.path)
+        return count
+
+
+def watch(outputs, workers=1, settle=2.0, poll_interval=5.0, polling=False):
+    """Keep the workbooks of the outputs up to date with the receipts in their folders."""
+    routes = {}
+    for output in outputs:
+        for extension in output.extractor.EXTENSIONS:
+            key = (os.path.normpath(output.folder), extension)
+            if key in routes:
+                raise ValueError(
+                    f"The {extension} files of '{output.folder}' would be extracted "
+                    f"into both '{routes[key].path}' and '{output.path}'"
+                )
+            routes[key] = output
+
+    def route(path):
+        folder, name = os.path.split(path)
+        extension = os.path.splitext(name)[1].lower()
+        return routes.get((os.path.normpath(folder), extension))
+
+    folders = sorted({output.folder for output in outputs})
+    pending = set()
+    # The size and modification time of the receipts extracted, by path
+    extracted = {}
+    # The receipts of the workbooks whose files are gone, by output
+    removed = {}
+    for output in outputs:
+        names = list_files(output.folder, output.extractor.EXTENSIONS)
+        for name in names:
+            path = os.path.join(output.folder, name)
+            stat = os.stat(path)
+            if output.is_written(path, stat):
+                extracted[path] = (stat.st_size, stat.st_mtime_ns)
+            else:
+                pending.add(path)
+        gone = output.receipts.keys() - set(names)
+        if gone:
+            removed[output] = [os.path.join(output.folder, name) for name in gone]
+
+    watcher = open_watcher(folders, poll_interval, polling)
+    print(f"Watching {', '.join(folders)} for receipts (press Ctrl+C to stop)")
+    try:
+        while True:
+            now = time.time()
+            ready = {}
+            timeout = None
+            for path in sorted(pending):
+                output = route(path)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    pending.discard(path)
+                    if extracted.pop(path, None) is not None:
+                        removed.setdefault(output, []).append(path)
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if signature == extracted.get(path) or not stat.st_size:
+                    pending.discard(path)
+                    continue
+                wait = stat.st_mtime + settle - now
+                if wait > 0:
+                    timeout = wait if timeout is None else min(timeout, wait)
+                    continue
+                pending.discard(path)
+                extracted[path] = signature
+                ready.setdefault(output, []).append(path)
+
+            for output in ready.keys() | removed.keys():
+                start = time.perf_counter()
+                count, row_count = output.update(
+                    ready.get(output, []), removed.get(output, []), workers
+                )
+                print(
+                    f"{time.strftime('%H:%M:%S')} '{output.path}': "
+                    f"{count} receipts extracted, "
+                    f"{len(removed.get(output, []))} removed, "
+                    f"{row_count} rows written "
+                    f"in {time.perf_counter() - start:.2f} s"
+                )
+            removed = {}
+
+            pending.update(
+                path for path in watcher.wait(timeout) if route(path) is not None
+            )
+    finally:
+        watcher.close()